@@ -0,0 +1,42 @@
+import json
+import random
+
+import pytest
+
+import main
+
+
+@pytest.fixture
+def instance(tmp_path, monkeypatch):
+    """
+    Write a small random instance (a grid of 64 nodes with some edges dropped, plus one isolated node) as
+    JSON files in the same format as the NYC instance, and load it with main.init().
+
+    Return the directory holding the JSON files.
+    """
+    rng = random.Random(0)
+    side = 8
+    G, Dist, Cost, Coord = {}, {}, {}, {}
+    for i in range(side * side):
+        node = str(i + 1)
+        G[node] = []
+        Coord[node] = [i % side * 100 + rng.randint(0, 20), i // side * 100 + rng.randint(0, 20)]
+    for i in range(side * side):
+        for j in (i + 1, i + side):
+            if (j == i + 1 and j % side == 0) or j >= side * side or rng.random() < 0.2:
+                continue
+            u, v = str(i + 1), str(j + 1)
+            dist, cost = rng.randint(50, 150), rng.randint(10, 90)
+            for a, b in ((u, v), (v, u)):
+                G[a].append(b)
+                Dist[f'{a},{b}'] = dist
+                Cost[f'{a},{b}'] = cost
+    isolated = str(side * side + 1)
+    G[isolated] = []
+    Coord[isolated] = [side * 100, side * 100]
+
+    for name, values in (('G', G), ('Dist', Dist), ('Cost', Cost), ('Coord', Coord)):
+        (tmp_path / f'{name}.json').write_text(json.dumps(values))
+    monkeypatch.chdir(tmp_path)
+    main.init()
+    return tmp_path
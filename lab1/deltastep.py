@@ -0,0 +1,167 @@
+import argparse
+import json
+import time
+
+import numpy as np
+
+import main
+
+# One-to-all shortest distances via delta-stepping over CSR arrays
+# ====================================================================================================
+
+
+def build_csr():
+    """
+    Build compressed sparse row (CSR) arrays from the loaded G, Dist and Cost dictionaries.
+
+    Return node ids, a dict of id to index, and the indptr, indices, dist and cost arrays.
+    """
+    ids = list(main.G.keys())
+    index = {node: i for i, node in enumerate(ids)}
+    degrees = np.fromiter((len(main.G[node]) for node in ids), dtype=np.int64, count=len(ids))
+    indptr = np.zeros(len(ids)+1, dtype=np.int64)
+    np.cumsum(degrees, out=indptr[1:])
+    indices = np.empty(indptr[-1], dtype=np.int64)
+    dist = np.empty(indptr[-1], dtype=np.float64)
+    cost = np.empty(indptr[-1], dtype=np.float64)
+    k = 0
+    for node in ids:
+        for neighbor in main.G[node]:
+            key = ','.join([node, neighbor])
+            indices[k] = index[neighbor]
+            dist[k] = main.Dist[key]
+            cost[k] = main.Cost[key]
+            k += 1
+    return ids, index, indptr, indices, dist, cost
+
+
+def gather_edges(indptr, frontier):
+    """
+    Return the positions (in the CSR edge arrays) of all edges leaving the frontier nodes,
+    together with the source node of each edge.
+    """
+    starts = indptr[frontier]
+    counts = indptr[frontier+1] - starts
+    total = counts.sum()
+    # Offset of each edge within its source's run, added to that source's first edge position
+    run_starts = np.repeat(np.cumsum(counts) - counts, counts)
+    edges = np.repeat(starts, counts) + (np.arange(total) - run_starts)
+    return edges, np.repeat(frontier, counts)
+
+
+def delta_stepping(csr, source, delta=None):
+    """
+    Delta-stepping single-source shortest distances from source to every node.
+
+    Frontier edges of each bucket are relaxed as one NumPy batch using np.minimum.at.
+    delta is the bucket width (defaults to the mean edge distance).
+    Return arrays of distance and energy (inf if unreachable) and the parent index of each node
+    (-1 for the source and unreachable nodes).
+    """
+    ids, index, indptr, indices, edist, ecost = csr
+    n = len(ids)
+    if delta is None:
+        delta = float(edist.mean()) if len(edist) else 1.0
+    src = index[source]
+
+    dist = np.full(n, np.inf)
+    dist[src] = 0
+    settled = np.zeros(n, dtype=bool)
+    frontier = np.array([src])
+    pending = np.empty(0, dtype=np.int64)  # Reached but unsettled nodes of later buckets
+    bucket = 0
+
+    while True:
+        # Relax the current bucket until none of its nodes improve any further
+        members = [frontier]
+        while frontier.size:
+            edges, sources = gather_edges(indptr, frontier)
+            targets = indices[edges]
+            candidates = dist[sources] + edist[edges]
+            before = dist[targets]
+            np.minimum.at(dist, targets, candidates)
+            improved = np.unique(targets[dist[targets] < before])
+            in_bucket = np.floor(dist[improved] / delta) == bucket
+            frontier = improved[in_bucket]
+            members.append(frontier)
+            pending = np.concatenate([pending, improved[~in_bucket]])
+        # Settle every node in the current bucket
+        settled[np.concatenate(members)] = True
+        # Move on to the lowest non-empty bucket among the unsettled nodes
+        pending = np.unique(pending)
+        pending = pending[~settled[pending]]
+        if not pending.size:
+            break
+        buckets = np.floor(dist[pending] / delta)
+        bucket = buckets.min()
+        frontier = pending[buckets == bucket]
+        pending = pending[buckets != bucket]
+
+    parent, energy = shortest_path_tree(csr, src, dist)
+    return dist, energy, parent
+
+
+def shortest_path_tree(csr, src, dist):
+    """
+    Recover a shortest path tree from final distances, and the energy consumed along it.
+
+    Return the parent index of each node and its energy from the source.
+    Among equally short paths the energy may differ from the one ucs_noconstraint reports.
+    """
+    ids, index, indptr, indices, edist, ecost = csr
+    n = len(ids)
+    sources = np.repeat(np.arange(n), np.diff(indptr))
+    # Tight edges lie on some shortest path; keep the first tight edge into each node
+    tight = np.flatnonzero(np.isfinite(dist[sources]) & (dist[sources] + edist == dist[indices]))
+    tight = tight[indices[tight] != src]
+    targets, first = np.unique(indices[tight], return_index=True)
+    parent = np.full(n, -1, dtype=np.int64)
+    parent[targets] = sources[tight[first]]
+    step = np.zeros(n)
+    step[targets] = ecost[tight[first]]
+
+    # Accumulate energy up the tree by pointer jumping (log n vectorized passes)
+    # Roots (source and unreachable nodes) point to themselves with zero energy
+    jump = np.where(parent >= 0, parent, np.arange(n))
+    while True:
+        step = step + step[jump]
+        nxt = jump[jump]
+        if np.array_equal(nxt, jump):
+            break
+        jump = nxt
+    energy = np.where(np.isfinite(dist), step, np.inf)
+    return parent, energy
+
+
+def reachability_report(source, delta=None):
+    """
+    Distance and energy of every reachable node from source.
+
+    Return a dict of node id to (distance, energy).
+    """
+    csr = build_csr()
+    dist, energy, _ = delta_stepping(csr, source, delta)
+    ids = csr[0]
+    return {ids[i]: (float(dist[i]), float(energy[i])) for i in np.flatnonzero(np.isfinite(dist))}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='One-to-all distances and energy from a depot.')
+    parser.add_argument('source', nargs='?', default=main.START)
+    parser.add_argument('--delta', type=float, help='Bucket width (default: mean edge distance)')
+    parser.add_argument('--output', help='Write the report to this JSON file')
+    args = parser.parse_args()
+
+    main.init()
+    csr = build_csr()
+    t = time.perf_counter()
+    dist, energy, _ = delta_stepping(csr, args.source, args.delta)
+    elapsed = time.perf_counter() - t
+    reachable = np.isfinite(dist)
+    print(f'Reachable nodes: {reachable.sum()}/{len(dist)}.')
+    print(f'Farthest distance: {dist[reachable].max()}.')
+    print(f'Search time: {elapsed:.3f}s.')
+    if args.output:
+        ids = csr[0]
+        with open(args.output, 'w') as f:
+            json.dump({ids[i]: [float(dist[i]), float(energy[i])] for i in np.flatnonzero(reachable)}, f)
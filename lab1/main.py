@@ -17,11 +17,19 @@ Cost = {}
 Coord = {}
 
 
-def init():
+def init(pages=None, memory_budget=None):
     """
     Initialize by loading the instance files (JSON) into dictionaries.
+
+    If pages is the directory of an instance built by paged.py, the dictionaries are replaced by
+    views that load pages of the graph from disk on demand, within memory_budget bytes.
     """
     global G, Dist, Cost, Coord
+    if pages:
+        from paged import PagedGraph, MEMORY_BUDGET
+        graph = PagedGraph(pages, memory_budget or MEMORY_BUDGET)
+        G, Dist, Cost, Coord = graph.G, graph.Dist, graph.Cost, graph.Coord
+        return
     with open('G.json') as f:
         G = json.load(f)
     with open('Dist.json') as f:
@@ -0,0 +1,321 @@
+import argparse
+import json
+import os
+import re
+import sys
+from array import array
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import numpy as np
+
+import main
+
+# Out-of-core graph storage
+# ====================================================================================================
+# The graph is split into pages of spatially close nodes (Z-order of Coord) stored as .npy arrays,
+# which are memory-mapped and decoded into small dicts only when the search touches them.
+# Node ids are assumed to be non-negative integers (as in the NYC instance).
+# Pages are built by streaming the JSON instance files, with edges written straight into memory-mapped
+# arrays, so only per-node arrays (about 40 bytes per node) are held in memory while building.
+PAGE_SIZE = 1024                    # No. of nodes per page
+MEMORY_BUDGET = 64 * 1024 * 1024    # Bytes of decoded pages kept in the LRU cache
+CHUNK_SIZE = 1 << 20                # Characters of JSON read at a time while building
+
+
+def morton_order(coords):
+    """
+    Return the permutation sorting points along a Z-order (Morton) curve.
+    """
+    lo = coords.min(axis=0)
+    span = np.maximum(coords.max(axis=0) - lo, 1)
+    q = ((coords - lo) / span * 0xFFFF).astype(np.uint64)
+    codes = np.zeros(len(coords), dtype=np.uint64)
+    for bit in range(16):
+        for axis in range(2):
+            codes |= ((q[:, axis] >> np.uint64(bit)) & np.uint64(1)) << np.uint64(2*bit + axis)
+    return np.argsort(codes, kind='stable')
+
+
+def iter_json_object(path, chunk_size=CHUNK_SIZE):
+    """
+    Yield the (key, value) pairs of the JSON object in path one at a time, reading the file in chunks.
+    """
+    decoder = json.JSONDecoder()
+    skip = re.compile(r'\s*').match
+    with open(path) as f:
+        buffer = f.read(chunk_size)
+        while buffer.isspace():
+            buffer = f.read(chunk_size)
+        pos = skip(buffer).end()
+        if buffer[pos:pos+1] != '{':
+            raise ValueError(f'{path} does not hold a JSON object')
+        pos += 1
+        while True:
+            # An item cut off by the end of the buffer fails to parse and is parsed again after reading on
+            try:
+                end = skip(buffer, pos).end()
+                if buffer[end] == '}':
+                    return
+                key, end = decoder.raw_decode(buffer, end)
+                end = skip(buffer, end).end()
+                if buffer[end] != ':':
+                    raise ValueError(f'Expected : after {key!r}')
+                value, end = decoder.raw_decode(buffer, skip(buffer, end+1).end())
+                end = skip(buffer, end).end()
+                # A number at the end of the buffer may be cut short, so its delimiter must be read too
+                if buffer[end] not in ',}':
+                    raise ValueError(f'Expected , or }} after the value of {key!r}')
+            except (IndexError, ValueError):
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise ValueError(f'Malformed JSON object in {path}')
+                buffer = buffer[pos:] + chunk
+                pos = 0
+            else:
+                yield key, value
+                pos = end + 1 if buffer[end] == ',' else end
+
+
+def build_pages(directory, page_size=PAGE_SIZE, instance='.'):
+    """
+    Partition the instance in the directory instance into spatially clustered pages and write them to
+    directory, streaming its JSON files (G.json is read twice).
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    def path(name):
+        return os.path.join(instance, f'{name}.json')
+
+    def open_edges(name, dtype):
+        return np.lib.format.open_memmap(os.path.join(directory, f'{name}.npy'), mode='w+', dtype=dtype,
+            shape=(int(indptr[-1]),))
+
+    # Nodes and their degrees, in the order of G
+    ids, degrees = array('q'), array('q')
+    for node, adjacent in iter_json_object(path('G')):
+        ids.append(int(node))
+        degrees.append(len(adjacent))
+    ids = np.frombuffer(ids, dtype=np.int64)
+    degrees = np.frombuffer(degrees, dtype=np.int64)
+    index = np.full(ids.max()+1, -1, dtype=np.int64)
+    index[ids] = np.arange(len(ids))
+
+    coords = np.full((len(ids), 2), np.nan)
+    integral_coord = True
+    for node, xy in iter_json_object(path('Coord')):
+        integral_coord = integral_coord and all(isinstance(v, int) for v in xy)
+        node = int(node)
+        if node < len(index) and index[node] >= 0:
+            coords[index[node]] = xy
+    if np.isnan(coords).any():
+        raise KeyError(f'No coordinates for node {ids[np.isnan(coords).any(axis=1)][0]}')
+
+    order = morton_order(coords)
+    ids, coords, degrees = ids[order], coords[order], degrees[order]
+    position = np.full(ids.max()+1, -1, dtype=np.int64)
+    position[ids] = np.arange(len(ids))
+    indptr = np.zeros(len(ids)+1, dtype=np.int64)
+    np.cumsum(degrees, out=indptr[1:])
+    for name, values in (('position', position), ('ids', ids), ('coord', coords), ('indptr', indptr)):
+        np.save(os.path.join(directory, f'{name}.npy'), values)
+
+    # Edges go straight to their slots in the memory-mapped arrays
+    edges = int(indptr[-1])
+    neighbors = open_edges('neighbors', np.int64)
+    for node, adjacent in iter_json_object(path('G')):
+        p = position[int(node)]
+        neighbors[indptr[p]:indptr[p+1]] = [int(v) for v in adjacent]
+    integral = {}
+    for name in ('dist', 'cost'):
+        values = open_edges(name, np.float64)
+        values[:] = np.nan
+        integral[name] = True
+        for key, value in iter_json_object(path(name.capitalize())):
+            node, neighbor = key.split(',', 1)
+            p = position[int(node)] if int(node) < len(position) else -1
+            if p < 0:
+                continue
+            lo, hi = indptr[p], indptr[p+1]
+            values[lo:hi][neighbors[lo:hi] == int(neighbor)] = value
+            integral[name] = integral[name] and float(value).is_integer()
+        for lo in range(0, edges, CHUNK_SIZE):
+            missing = np.flatnonzero(np.isnan(values[lo:lo+CHUNK_SIZE]))
+            if len(missing):
+                k = lo + missing[0]
+                node = ids[np.searchsorted(indptr, k, side='right') - 1]
+                raise KeyError(f'No {name} for edge {node},{neighbors[k]}')
+        values.flush()
+    neighbors.flush()
+
+    with open(os.path.join(directory, 'meta.json'), 'w') as f:
+        json.dump({
+            'page_size': page_size,
+            'nodes': len(ids),
+            'edges': edges,
+            # Restore ints on decoding so results print as they do with the JSON instance
+            'integral_coord': integral_coord,
+            'integral_dist': integral['dist'],
+            'integral_cost': integral['cost'],
+        }, f)
+
+
+def deep_size(page):
+    """
+    Return the bytes taken by the decoded dicts of page, counting each object once.
+    """
+    seen = set()
+    total = 0
+    stack = [page.adjacency, page.coord, page.dist, page.cost]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj)
+            stack.extend(obj.values())
+        elif isinstance(obj, list):
+            stack.extend(obj)
+    return total
+
+
+class Page:
+    def __init__(self, graph, number):
+        start = number * graph.page_size
+        stop = min(start + graph.page_size, graph.nodes)
+        lo, hi = int(graph.indptr[start]), int(graph.indptr[stop])
+        ids = graph.ids[start:stop].tolist()
+        offsets = (graph.indptr[start:stop+1] - lo).tolist()
+        neighbors = [str(v) for v in graph.neighbors[lo:hi].tolist()]
+        dist = graph.decode(graph.dist[lo:hi], 'dist')
+        cost = graph.decode(graph.cost[lo:hi], 'cost')
+        coords = graph.decode(graph.coord[start:stop], 'coord')
+
+        self.adjacency = {}
+        self.coord = {}
+        self.dist = {}
+        self.cost = {}
+        for i, node in enumerate(ids):
+            node = str(node)
+            adjacent = neighbors[offsets[i]:offsets[i+1]]
+            self.adjacency[node] = adjacent
+            self.coord[node] = coords[i]
+            for k, neighbor in enumerate(adjacent, offsets[i]):
+                key = ','.join([node, neighbor])
+                self.dist[key] = dist[k]
+                self.cost[key] = cost[k]
+        self.nbytes = deep_size(self)
+
+
+class PagedGraph:
+    def __init__(self, directory, memory_budget=MEMORY_BUDGET):
+        with open(os.path.join(directory, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.page_size = self.meta['page_size']
+        self.nodes = self.meta['nodes']
+        self.memory_budget = memory_budget
+        # Memory-mapped arrays; the OS pages them in as slices are read
+        for name in ('position', 'ids', 'coord', 'indptr', 'neighbors', 'dist', 'cost'):
+            setattr(self, name, np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r'))
+
+        self.cache = OrderedDict()  # Page number -> Page, least recently used first
+        self.cached_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Dict-like views used in place of G, Dist, Cost and Coord
+        self.G = PagedView(self, lambda node: node, 'adjacency', self.nodes)
+        self.Dist = PagedView(self, lambda key: key.split(',', 1)[0], 'dist', self.meta['edges'])
+        self.Cost = PagedView(self, lambda key: key.split(',', 1)[0], 'cost', self.meta['edges'])
+        self.Coord = PagedView(self, lambda node: node, 'coord', self.nodes)
+
+    def decode(self, values, field):
+        if self.meta[f'integral_{field}']:
+            return values.astype(np.int64).tolist()
+        return values.tolist()
+
+    def page_of(self, node):
+        """
+        Return the page holding node, faulting it in (and evicting old pages) if needed.
+        """
+        try:
+            pos = int(self.position[int(node)])
+        except (ValueError, IndexError):
+            raise KeyError(node)
+        if pos < 0:
+            raise KeyError(node)
+        number = pos // self.page_size
+        page = self.cache.get(number)
+        if page is not None:
+            self.hits += 1
+            self.cache.move_to_end(number)
+            return page
+        self.misses += 1
+        page = Page(self, number)
+        self.cache[number] = page
+        self.cached_bytes += page.nbytes
+        # Keep at least the page just loaded even if it alone exceeds the budget
+        while self.cached_bytes > self.memory_budget and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.cached_bytes -= evicted.nbytes
+            self.evictions += 1
+        return page
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'lookups': lookups,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else None,
+            'evictions': self.evictions,
+            'resident_pages': len(self.cache),
+            'resident_bytes': self.cached_bytes,
+        }
+
+
+class PagedView(Mapping):
+    # Read-only mapping resolving each key through the page of the node it belongs to
+    def __init__(self, graph, node_of, field, size):
+        self.graph = graph
+        self.node_of = node_of
+        self.field = field
+        self.size = size
+
+    def __getitem__(self, key):
+        page = self.graph.page_of(self.node_of(key))
+        return getattr(page, self.field)[key]
+
+    def __iter__(self):
+        for number in range(-(-self.graph.nodes // self.graph.page_size)):
+            page = self.graph.page_of(str(int(self.graph.ids[number * self.graph.page_size])))
+            yield from list(getattr(page, self.field))
+
+    def __len__(self):
+        return self.size
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build or search an out-of-core paged instance.')
+    parser.add_argument('command', choices=['build', 'run'])
+    parser.add_argument('directory', help='Directory holding the pages')
+    parser.add_argument('--page-size', type=int, default=PAGE_SIZE, help='Nodes per page (build)')
+    parser.add_argument('--instance', default='.', help='Directory of the JSON instance files (build)')
+    parser.add_argument('--budget', type=int, default=MEMORY_BUDGET, help='Page cache size in bytes (run)')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_pages(args.directory, args.page_size, args.instance)
+    else:
+        main.init(pages=args.directory, memory_budget=args.budget)
+        for task, search in (('TASK 1', main.ucs_noconstraint), ('TASK 2', main.ucs), ('TASK 3', main.astar)):
+            path, distance, cost = search(main.START, main.END) or main.NO_PATH
+            print(f'\n[{task}]')
+            print('Shortest path: {}.'.format('->'.join(path)))
+            print('Shortest distance: {}.'.format(str(distance)))
+            print('Total energy cost: {}.'.format(str(cost)))
+            print()
+        print('Page cache:', main.G.graph.stats())
@@ -0,0 +1,200 @@
+import argparse
+import asyncio
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+
+import main
+
+# Resident query server
+# ====================================================================================================
+# Loads the instance once per worker process and answers queries over HTTP (TCP or Unix socket)
+#   GET /query?algo=astar&start=1&goal=50
+#   GET /health
+ALGORITHMS = {
+    'ucs_noconstraint': main.ucs_noconstraint,
+    'ucs': main.ucs,
+    'astar': main.astar,
+}
+LATENCY_WINDOW = 1000  # No. of most recent latencies kept for percentiles
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+def run_search(algo, start, goal):
+    """
+    Run one search inside a worker process (instance already loaded by init()).
+
+    Return the path, distance travelled and energy consumed, or None if no path.
+    """
+    return ALGORITHMS[algo](start, goal)
+
+
+def percentile(values, p):
+    """
+    Return the p-th percentile (nearest-rank) of a list of values, or None if empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered)-1, round(p / 100 * len(ordered)) - 1))
+    return ordered[k]
+
+
+def latency_percentiles(latencies):
+    """
+    Return the p50, p90 and p99 of latencies (in seconds) in milliseconds.
+    """
+    latencies = list(latencies)
+    return {
+        p: (None if v is None else round(v * 1000, 3))
+        for p, v in (('p50', percentile(latencies, 50)),
+                     ('p90', percentile(latencies, 90)),
+                     ('p99', percentile(latencies, 99)))
+    }
+
+
+class QueryServer:
+    def __init__(self, workers=None):
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=main.init)
+        self.inflight = {}                                  # (algo, start, goal) -> Future
+        self.latencies = deque(maxlen=LATENCY_WINDOW)       # Seconds per query (coalesced ones included)
+        self.search_latencies = deque(maxlen=LATENCY_WINDOW)  # Seconds per search
+        self.queries = 0                                    # Total no. of queries received
+        self.searches = 0                                   # Total no. of searches run
+        self.coalesced = 0                                  # Queries served by an in-flight search
+
+    async def query(self, algo, start, goal):
+        """
+        Return the result of a search, sharing one search among identical concurrent queries.
+        """
+        self.queries += 1
+        start_time = time.perf_counter()
+        try:
+            return await self.search(algo, start, goal)
+        finally:
+            self.latencies.append(time.perf_counter() - start_time)
+
+    async def search(self, algo, start, goal):
+        """
+        Run a search in a worker process, or wait for the identical search already in flight.
+        """
+        key = (algo, start, goal)
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # The search this query waited for was cancelled (e.g., its client went away), not this query
+                if future.cancelled() and not asyncio.current_task().cancelling():
+                    raise RuntimeError('shared search was cancelled')
+                raise
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.inflight[key] = future
+        self.searches += 1
+        start_time = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(self.executor, run_search, algo, start, goal)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            self.search_latencies.append(time.perf_counter() - start_time)
+            del self.inflight[key]
+            # E.g., cancelled: resolve the future anyway so that coalesced queries do not wait forever
+            if not future.done():
+                future.cancel()
+            # Avoid "exception never retrieved" warnings when no one else was waiting
+            if future.done() and not future.cancelled():
+                future.exception()
+
+    def metrics(self):
+        return {
+            'status': 'ok',
+            'queue_depth': len(self.inflight),
+            'queries': self.queries,
+            'searches': self.searches,
+            'coalesced': self.coalesced,
+            # Latency seen by clients, and latency of the searches themselves
+            'latency_ms': latency_percentiles(self.latencies),
+            'search_latency_ms': latency_percentiles(self.search_latencies),
+        }
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            # Skip headers (no request bodies are accepted)
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            try:
+                method, target, _ = request_line.decode().split(' ', 2)
+            except ValueError:
+                await self.respond(writer, 400, {'error': 'malformed request'})
+                return
+            url = urlsplit(target)
+            if method != 'GET':
+                await self.respond(writer, 405, {'error': 'only GET is supported'})
+            elif url.path == '/health':
+                await self.respond(writer, 200, self.metrics())
+            elif url.path == '/query':
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                algo = params.get('algo', 'astar')
+                start = params.get('start', main.START)
+                goal = params.get('goal', main.END)
+                if algo not in ALGORITHMS:
+                    await self.respond(writer, 400, {'error': f'unknown algo {algo!r}'})
+                    return
+                result = await self.query(algo, start, goal)
+                if result is None:
+                    await self.respond(writer, 200, {'path': None})
+                else:
+                    path, distance, cost = result
+                    await self.respond(writer, 200, {'path': path, 'distance': distance, 'cost': cost})
+            else:
+                await self.respond(writer, 404, {'error': 'not found'})
+        except KeyError as e:
+            await self.respond(writer, 400, {'error': f'unknown node {e}'})
+        except Exception as e:
+            await self.respond(writer, 500, {'error': f'{type(e).__name__}: {e}'})
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, body):
+        payload = json.dumps(body).encode()
+        writer.write(f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                     f'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(payload)}\r\n'
+                     f'Connection: close\r\n\r\n'.encode() + payload)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8000, unix=None):
+        if unix:
+            server = await asyncio.start_unix_server(self.handle, path=unix)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve shortest path queries on a preloaded instance.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--unix', help='Listen on this Unix socket path instead of TCP')
+    parser.add_argument('--workers', type=int, help='No. of search worker processes')
+    args = parser.parse_args()
+
+    server = QueryServer(args.workers)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.executor.shutdown()
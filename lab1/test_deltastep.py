@@ -0,0 +1,39 @@
+import math
+
+import numpy as np
+
+import main
+from deltastep import build_csr, delta_stepping, reachability_report
+
+
+def test_distances_match_ucs_noconstraint(instance):
+    csr = build_csr()
+    ids = csr[0]
+    for delta in (None, 1.0, 1000.0):
+        dist, energy, parent = delta_stepping(csr, main.START, delta)
+        for i, node in enumerate(ids):
+            result = main.ucs_noconstraint(main.START, node)
+            if result is None:
+                assert dist[i] == math.inf and energy[i] == math.inf and parent[i] == -1
+            else:
+                assert dist[i] == result[1]
+
+
+def test_energy_follows_the_shortest_path_tree(instance):
+    csr = build_csr()
+    ids = csr[0]
+    dist, energy, parent = delta_stepping(csr, main.START)
+    for i in np.flatnonzero(np.isfinite(dist)):
+        if parent[i] < 0:
+            assert ids[i] == main.START and energy[i] == 0
+            continue
+        key = ','.join([ids[parent[i]], ids[i]])
+        assert dist[i] == dist[parent[i]] + main.Dist[key]
+        assert energy[i] == energy[parent[i]] + main.Cost[key]
+
+
+def test_report_leaves_out_unreachable_nodes(instance):
+    report = reachability_report(main.START)
+    assert report[main.START] == (0.0, 0.0)
+    assert str(len(main.G)) not in report
+    assert len(report) == sum(main.ucs_noconstraint(main.START, node) is not None for node in main.G)
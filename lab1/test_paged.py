@@ -0,0 +1,33 @@
+import json
+
+import main
+from paged import PagedGraph, build_pages
+
+
+def load_instance(directory):
+    return {name: json.loads((directory / f'{name}.json').read_text()) for name in ('G', 'Dist', 'Cost', 'Coord')}
+
+
+def test_views_match_the_json_instance(instance, tmp_path_factory):
+    pages = tmp_path_factory.mktemp('pages')
+    build_pages(pages, page_size=8, instance=instance)
+    # A budget of about two pages, so that lookups keep evicting
+    graph = PagedGraph(pages, memory_budget=8 * 1024)
+    views = {'G': graph.G, 'Dist': graph.Dist, 'Cost': graph.Cost, 'Coord': graph.Coord}
+    for name, expected in load_instance(instance).items():
+        view = views[name]
+        assert len(view) == len(expected)
+        assert dict(view) == expected
+        for key, value in expected.items():
+            assert view[key] == value
+    assert graph.evictions > 0
+    assert graph.cached_bytes <= graph.memory_budget or len(graph.cache) == 1
+
+
+def test_searches_match_the_json_instance(instance, tmp_path_factory):
+    pages = tmp_path_factory.mktemp('pages')
+    build_pages(pages, page_size=8, instance=instance)
+    searches = (main.ucs_noconstraint, main.ucs, main.astar)
+    expected = [search(main.START, main.END) for search in searches]
+    main.init(pages=pages, memory_budget=8 * 1024)
+    assert [search(main.START, main.END) for search in searches] == expected
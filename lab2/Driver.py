@@ -1,9 +1,22 @@
+import argparse
+import collections
+import functools
+import itertools
 import random
 import sys
+import time
+
+import numpy as np
+from pyswip import Atom, Functor, Prolog, Term, Variable, getTerm
+from pyswip.core import (PL_Q_CATCH_EXCEPTION, PL_Q_NODEBUG, PL_cut_query, PL_discard_foreign_frame, PL_exception,
+    PL_next_solution, PL_open_foreign_frame, PL_open_query, PL_predicate, PL_unify_float)
+from pyswip.prolog import PrologError
+
+from frames import DeltaFrameWriter
+from profiler import Profiler, write_json
+from traces import TraceRecorder
 
-from pyswip import Prolog
 prolog = Prolog()
-prolog.consult('JP-Agent.pl')
 
 
 # Map layout
@@ -25,213 +38,612 @@ layout1 = [
 ]
 
 
+# Agent knowledge snapshot
+# ====================================================================================================
+# Localisation and mapping terms queried in one snapshot together with current(X,Y,D)
+# I.e., current(X,Y,D), findall([A,B],safe(A,B),Safe), ..., findall([A,B],wall(A,B),Wall)
+SNAPSHOT_TERMS = ['safe', 'visited', 'wumpus', 'confundus', 'stench', 'tingle', 'glitter', 'wall']
+
+
+# Agent call layer
+# ====================================================================================================
+# Every query from Driver to Agent goes through AgentClient, which records it in the profiler
+# Goals are pyswip terms built once (per distinct arguments) and run via call/1, so Prolog never has to
+# parse query text, and solutions are read straight from the goal's variables
+# Knowledge queries are memoized until the next call that changes Agent's state (move, reposition,
+# reborn), and the snapshot answers current(X,Y,D) and any of SNAPSHOT_TERMS at a position without Agent
+# Each AgentClient may load its own copy of Agent into a separate Prolog module, so that many Agents
+# (one per Simulator) can share one Prolog engine, as long as their queries do not run at the same time
+# While a deadline is set (see Budget), a query still running at the deadline is aborted by Prolog, and a
+# query that ends after the deadline (had Prolog not been able to abort it) exceeds the budget all the same
+# A query that never ends can only be stopped by Prolog, through call_with_time_limit/2
+AGENT_PATH = 'JP-Agent.pl'
+CALL = PL_predicate('call', 1, None)
+COLON = Functor(':', 2)
+COMMA = Functor(',', 2)
+FINDALL = Functor('findall', 3)
+TIME_LIMIT = Functor('call_with_time_limit', 2)
+CONSULT = Functor('consult', 1)
+SETUP_CALL_CLEANUP = Functor('setup_call_cleanup', 3)
+OPEN = Functor('open', 3)
+CLOSE = Functor('close', 1)
+LOAD_FILES = Functor('load_files', 2)
+STREAM = Functor('stream', 1)
+
+
+# Convert a term read from Prolog to Python (atoms to strings)
+def from_prolog(value):
+    if isinstance(value, Atom):
+        return value.value
+    if isinstance(value, list):
+        return [from_prolog(item) for item in value]
+    return value
+
+
+class AgentClient:
+    def __init__(self, profiler, module=None, path=AGENT_PATH, memoize=True):
+        self.profiler = profiler
+        # Prolog module holding Agent's knowledge base (None for the user module)
+        self.module = module
+        # Agent's source, loaded on the first query
+        self.path = path
+        self.loaded = False
+        # (name, args) -> goal term, for goals with no variables
+        self.goals = {}
+        self.memoize = memoize
+        # (name, args) -> solutions, since Agent's state last changed
+        self.cache = {}
+        # Term -> set of (x, y) positions, from the snapshot taken since Agent's state last changed
+        self.facts = {}
+        # Term -> list of [x, y] positions and frozenset of (x, y) positions, from the last snapshot taken
+        # (kept when Agent's state changes, so that each snapshot only converts the terms that changed)
+        self.snapshot_facts = {term: ([], frozenset()) for term in SNAPSHOT_TERMS}
+        # TraceRecorder of the calls that change Agent's state and of explore(L) (see traces.py), if any
+        self.trace = None
+        # time.perf_counter() time by which every query must end, if any
+        self.deadline = None
+
+        x, y, d, actions = Variable(), Variable(), Variable(), Variable()
+        current = Functor('current', 3)(x, y, d)
+        self.current_goal = self.qualify(current)
+        self.current_vars = [x, y, d]
+        self.explore_goal = self.qualify(Functor('explore', 1)(actions))
+        self.explore_vars = [actions]
+        # The template variables A, B of every findall are never bound, so they are shared
+        a, b = Variable(), Variable()
+        self.snapshot_vars = [x, y, d]
+        snapshot = current
+        for term in SNAPSHOT_TERMS:
+            facts = Variable()
+            self.snapshot_vars.append(facts)
+            snapshot = COMMA(snapshot, FINDALL([a, b], Functor(term, 2)(a, b), facts))
+        self.snapshot_goal = self.qualify(snapshot)
+
+    # Load Agent into its module
+    # Agent's source is read from a stream under the module's name, since SWI-Prolog loads a (non-module)
+    # file only once and would otherwise take it as already loaded into another module
+    # The path and module are put into the goal as atoms, so they need no quoting
+    def load(self):
+        if self.module is None:
+            goal = CONSULT(self.path)
+        else:
+            stream = Variable()
+            goal = SETUP_CALL_CLEANUP(OPEN(self.path, 'read', stream),
+                LOAD_FILES(COLON(self.module, self.module), [STREAM(stream)]), CLOSE(stream))
+        if not self.run('load', goal):
+            raise PrologError(f'Could not load {self.path}')
+        self.loaded = True
+
+    # Return goal as module:goal for Agent's module
+    def qualify(self, goal):
+        return goal if self.module is None else COLON(self.module, goal)
+
+    # Return the ground goal name(*args), where strings are atoms and tuples are lists
+    def goal(self, name, *args):
+        key = (name, args)
+        goal = self.goals.get(key)
+        if goal is None:
+            goal = self.goals[key] = self.qualify(Functor(name, len(args))(*[list(arg) if isinstance(arg, tuple) else arg for arg in args]))
+        return goal
+
+    # Run goal (after loading Agent if needed) and return the list of solutions, each solution being the
+    # list of values of variables
+    def query(self, predicate, goal, variables=()):
+        if not self.loaded:
+            self.load()
+        return self.run(predicate, goal, variables)
+
+    # Run goal as it is, and record the query under predicate in the profiler
+    def run(self, predicate, goal, variables=()):
+        self.check_deadline()
+        start_time = time.perf_counter()
+        # Every term reference made by the query is freed, and every binding undone, with the frame
+        frame = PL_open_foreign_frame()
+        qid = None
+        try:
+            if self.deadline is not None:
+                # pyswip cannot put a Python float into a term, so the time limit is unified with a new one
+                limit = Term()
+                PL_unify_float(limit.handle, self.deadline - start_time)
+                goal = TIME_LIMIT(limit, goal)
+            qid = PL_open_query(None, PL_Q_NODEBUG | PL_Q_CATCH_EXCEPTION, CALL, goal.handle)
+            result = []
+            while PL_next_solution(qid):
+                result.append([from_prolog(getTerm(variable.handle)) for variable in variables])
+                self.check_deadline()
+            if PL_exception(qid):
+                error = from_prolog(getTerm(PL_exception(qid)))
+                if str(error).startswith('time_limit_exceeded'):
+                    raise BudgetExceeded('seconds')
+                raise PrologError(f'Caused by {predicate}: {error}')
+            self.check_deadline()
+        finally:
+            if qid is not None:
+                PL_cut_query(qid)
+            PL_discard_foreign_frame(frame)
+        self.profiler.record_query(predicate, time.perf_counter() - start_time, len(result))
+        return result
+
+    def check_deadline(self):
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise BudgetExceeded('seconds')
+
+    # Run a query that does not change Agent's state, or return its solutions if they are cached
+    def ask(self, key, predicate, goal, variables=()):
+        result = self.cache.get(key)
+        if result is None:
+            result = self.query(predicate, goal, variables)
+            if self.memoize:
+                self.cache[key] = result
+        else:
+            self.profiler.record_cached(predicate)
+        return result
+
+    # Run the ground goal predicate(*args) that changes Agent's state, which invalidates the cache
+    def tell(self, predicate, *args):
+        if self.trace:
+            self.trace.record(predicate, *args)
+        self.cache.clear()
+        self.facts.clear()
+        self.query(predicate, self.goal(predicate, *args))
+
+    def holds(self, name, *args):
+        facts = self.facts.get(name)
+        if facts is not None:
+            self.profiler.record_cached(name)
+            return args in facts
+        return bool(self.ask((name, args), name, self.goal(name, *args)))
+
+    def move(self, action, indicators):
+        self.tell('move', action, tuple(indicators))
+
+    def reposition(self, indicators):
+        self.tell('reposition', tuple(indicators))
+
+    def reborn(self):
+        self.tell('reborn')
+
+    # Return the list of actions suggested by explore(L)
+    def explore(self):
+        actions = self.ask(('explore', ()), 'explore', self.explore_goal, self.explore_vars)[0][0]
+        if self.trace:
+            self.trace.record('explore', actions)
+        return actions
+
+    # Return Agent's relative position and direction via current(X,Y,D), or None
+    def current(self):
+        result = self.ask(('current', ()), 'current', self.current_goal, self.current_vars)
+        if result:
+            return tuple(result[0])
+
+    # Return Agent's relative position and direction, and a dict of each of SNAPSHOT_TERMS to the frozenset
+    # of its relative (x, y) positions
+    # A term whose positions are the same as in the last snapshot keeps the same frozenset, so that callers
+    # can tell unchanged terms apart by identity
+    def snapshot(self):
+        result = self.ask(('snapshot', ()), 'snapshot', self.snapshot_goal, self.snapshot_vars)
+        x, y, direction, *lists = result[0]
+        facts = {}
+        for term, positions in zip(SNAPSHOT_TERMS, lists):
+            if positions != self.snapshot_facts[term][0]:
+                self.snapshot_facts[term] = positions, frozenset((a, b) for a, b in positions)
+            facts[term] = self.snapshot_facts[term][1]
+        if self.memoize:
+            self.cache[('current', ())] = [[x, y, direction]]
+            self.facts.update(facts)
+        return (x, y, direction), facts
+
+
+# Agent in the user module, used by every Simulator not given its own
+default_agent = AgentClient(Profiler())
+
+
+# Episode stops
+# ====================================================================================================
+# Raised when test_explore cannot make progress: Agent suggests no actions and Driver has none to force
+class AgentStuck(Exception):
+    pass
+
+
+# Episode budgets
+# ====================================================================================================
+# Upper bounds on one test_explore episode: no. of actions simulated, no. of queries to Agent (cached ones
+# included, since Driver may loop on cached answers without Agent's state changing) and seconds of wall time
+# Budgets are checked before every action and every round of explore(L), and the time budget is also the
+# deadline of every query, so that an episode never runs much longer than its budgets allow
+class BudgetExceeded(Exception):
+    def __init__(self, budget):
+        super().__init__(f'{budget} budget exceeded')
+        self.budget = budget  # 'steps', 'queries' or 'seconds'
+
+
+class Budget:
+    def __init__(self, steps=None, queries=None, seconds=None):
+        self.steps = steps
+        self.queries = queries
+        self.seconds = seconds
+        self.start_time = None
+        self.start_queries = 0
+
+    # No. of queries to Agent recorded by profiler, answered by Prolog or from the cache
+    @staticmethod
+    def count_queries(profiler):
+        return sum(stats.calls + stats.cached for stats in profiler.queries.values())
+
+    # Start an episode of simulator
+    def start(self, simulator):
+        self.start_time = time.perf_counter()
+        self.start_queries = self.count_queries(simulator.agent.profiler)
+        if self.seconds is not None:
+            simulator.agent.deadline = self.start_time + self.seconds
+
+    def stop(self, simulator):
+        simulator.agent.deadline = None
+
+    def usage(self, simulator):
+        return {
+            'steps': simulator.steps,
+            'queries': self.count_queries(simulator.agent.profiler) - self.start_queries,
+            'seconds': time.perf_counter() - self.start_time
+        }
+
+    # Raise BudgetExceeded if any budget is used up
+    def check(self, simulator):
+        usage = self.usage(simulator)
+        for budget in ('steps', 'queries', 'seconds'):
+            limit = getattr(self, budget)
+            if limit is not None and usage[budget] >= limit:
+                raise BudgetExceeded(budget)
+
+    # Structured outcome of an episode stopped by BudgetExceeded
+    def report(self, exceeded, simulator):
+        return {
+            'budget': exceeded.budget,
+            'limits': {'steps': self.steps, 'queries': self.queries, 'seconds': self.seconds},
+            'used': self.usage(simulator)
+        }
+
+
+# Cell encoding
+# ====================================================================================================
+# Each map cell is one 16-bit word in a NumPy buffer owned by its world
+# Bits 0-5: Sensory indicators, in the same order as L in move(A,L)
+CONFOUNDED = 1 << 0
+STENCH = 1 << 1
+TINGLE = 1 << 2
+GLITTER = 1 << 3
+BUMP = 1 << 4
+SCREAM = 1 << 5
+INDICATORS = [('Confounded', CONFOUNDED), ('Stench', STENCH), ('Tingle', TINGLE),
+    ('Glitter', GLITTER), ('Bump', BUMP), ('Scream', SCREAM)]
+# Bit 6: Cell contains Agent or NPC
+INHABITED = 1 << 6
+# Bits 8-11: Contents of cell (symbol 5)
+CONTENTS_SHIFT = 8
+UNKNOWN, WUMPUS, PORTAL, WUMPUS_OR_PORTAL, NORTH, EAST, SOUTH, WEST, SAFE_UNVISITED, SAFE_VISITED, WALL = range(11)
+CONTENTS_SYMBOLS = '?WOU^>v<sS#'
+DIRECTIONS = {
+    'north': NORTH, 'east': EAST, 'south': SOUTH, 'west': WEST,
+    'rnorth': NORTH, 'reast': EAST, 'rsouth': SOUTH, 'rwest': WEST
+}
+# Absolute direction after turning left or right
+LEFT_OF = {'north': 'west', 'east': 'north', 'south': 'east', 'west': 'south'}
+RIGHT_OF = {'north': 'east', 'east': 'south', 'south': 'west', 'west': 'north'}
+# Absolute row, column offsets of the cell ahead in each absolute direction
+AHEAD_OF = {'north': (-1, 0), 'east': (0, 1), 'south': (1, 0), 'west': (0, -1)}
+# List of on/offs for every combination of sensory indicators, e.g., [on,off,off,off,off,off]
+ONOFFS = [[('on' if mask & flag else 'off') for _, flag in INDICATORS] for mask in range(1 << len(INDICATORS))]
+
+
+# Symbols 1-9 of a cell word as a string (see MapCell), e.g., '%..->-...'
+@functools.lru_cache(maxsize=None)
+def cell_symbols(word):
+    if word >> CONTENTS_SHIFT == WALL:
+        return '#' * 9
+    inhabited = '-' if word & INHABITED else ' '
+    return ''.join([
+        '%' if word & CONFOUNDED else '.', '=' if word & STENCH else '.', 'T' if word & TINGLE else '.',
+        inhabited, CONTENTS_SYMBOLS[word >> CONTENTS_SHIFT], inhabited,
+        '*' if word & GLITTER else '.', 'B' if word & BUMP else '.', '@' if word & SCREAM else '.'
+    ])
+
+
+# The three lines of the 3x3 square of symbols of a cell word, e.g., ('% . .', '- > -', '. . .')
+@functools.lru_cache(maxsize=None)
+def render_square(word):
+    symbols = cell_symbols(word)
+    return tuple(' '.join(symbols[k:k+3]) for k in (0, 3, 6))
+
+
+# Mark cells that are orthogonally adjacent to any cell of a boolean mask
+def adjacent_mask(mask):
+    adjacent = np.zeros_like(mask)
+    adjacent[1:, :] |= mask[:-1, :]
+    adjacent[:-1, :] |= mask[1:, :]
+    adjacent[:, 1:] |= mask[:, :-1]
+    adjacent[:, :-1] |= mask[:, 1:]
+    return adjacent
+
+
+# Render a buffer of cell words as a map of 3x3 squares, as one string
+def render_cells(cells):
+    lines = []
+    for words in cells.tolist():
+        squares = [render_square(word) for word in words]
+        for k in range(3):
+            lines.append(''.join([f'{square[k]}  ' for square in squares]))
+        lines.append('')
+    lines.append('')
+    return '\n'.join(lines)
+
+
+# Set with O(1) add, discard and uniform random choice (used to index safe cells)
+# ====================================================================================================
+class IndexedSet:
+    def __init__(self, items=()):
+        self.items = list(items)                                         # Items in arbitrary order
+        self.positions = dict(zip(self.items, range(len(self.items))))  # Item -> index in items
+        # Drop repeated items, if any
+        if len(self.positions) < len(self.items):
+            self.items = list(dict.fromkeys(self.items))
+            self.positions = dict(zip(self.items, range(len(self.items))))
+
+    def __contains__(self, item):
+        return item in self.positions
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item):
+        if item not in self.positions:
+            self.positions[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item):
+        # Move the last item into the freed slot
+        i = self.positions.pop(item, None)
+        if i is not None:
+            last = self.items.pop()
+            if i < len(self.items):
+                self.items[i] = last
+                self.positions[last] = i
+
+    def choice(self, rng=random):
+        return rng.choice(self.items)
+
+    def copy(self):
+        other = IndexedSet()
+        other.items = self.items.copy()
+        other.positions = self.positions.copy()
+        return other
+
+
 # Class representing each grid map cell of the world
 # ====================================================================================================
 class MapCell:
-    def __init__(self, x, y):
+    # Lightweight view of one cell word in the buffer of an AbsoluteWorld or RelativeWorld
+    # Views are cheap to create and should not be kept across a resize of the buffer
+    # If safe_cells is given, the view keeps the (x, y) of the cell in it whenever the cell is safe
+    __slots__ = ('cells', 'row', 'col', 'x', 'y', 'safe_cells')
+
+    def __init__(self, cells, row, col, x, y, safe_cells=None):
+        self.cells = cells
+        self.row = row
+        self.col = col
         self.x = x
         self.y = y
-        # Sensory indicators
-        self.indicators = {
-            'Confounded': 'off', 
-            'Stench': 'off', 
-            'Tingle': 'off', 
-            'Glitter': 'off', 
-            'Bump': 'off', 
-            'Scream': 'off'
-        }
-        # Symbol 1: Confounded ('%' for On, '.' for Off)
-        # Symbol 2: Stench ('=' for On, '.' for Off)
-        # Symbol 3: Tingle ('T' for On, '.' for Off)
-        # Symbol 4: '-' if cell contains Agent or NPC else ' '
-        # Symbol 5: 
-        # 'W' if cell contains (or possibly contains) Wumpus
-        # 'O' if cell contains (or possibly contains) Confundus Portal
-        # 'U' if cell possibly contains either Wumpus or Confundus Portal
-        # '^', '>', 'v', '<': Agent facing North, East, South, West directions
-        # 's' for non-visited safe cell (no Agent)
-        # 'S' for visited safe cell (no Agent)
-        # '?' if none of the above
-        # Symbol 6: '-' if cell contains Agent or NPC else ' '
-        # Symbol 7: Glitter ('*' for On, '.' for Off)
-        # Symbol 8: Bump ('B' for On, '.' for Off)
-        # Symbol 9: Scream ('@' for On, '.' for Off)
-        self.symbols = {
-            '1': '.', 
-            '2': '.', 
-            '3': '.', 
-            '4': ' ', 
-            '5': '?', 
-            '6': ' ', 
-            '7': '.', 
-            '8': '.', 
-            '9': '.'
-        }
-        # 3x3 square of symbols
-        self.square = [
-            [self.symbols['1'], self.symbols['2'], self.symbols['3']], 
-            [self.symbols['4'], self.symbols['5'], self.symbols['6']], 
-            [self.symbols['7'], self.symbols['8'], self.symbols['9']]
-        ]
-
-    def update_square(self):
-        self.square = [
-            [self.symbols['1'], self.symbols['2'], self.symbols['3']], 
-            [self.symbols['4'], self.symbols['5'], self.symbols['6']], 
-            [self.symbols['7'], self.symbols['8'], self.symbols['9']]
-        ]
+        self.safe_cells = safe_cells
+
+    @property
+    def word(self):
+        return int(self.cells[self.row, self.col])
+
+    def set_flags(self, flags):
+        self.cells[self.row, self.col] = self.word | flags
+
+    def unset_flags(self, flags):
+        self.cells[self.row, self.col] = self.word & ~flags
+
+    def has(self, flag):
+        return bool(self.word & flag)
+
+    @property
+    def contents(self):
+        return self.word >> CONTENTS_SHIFT
+
+    def set_contents(self, contents):
+        self.cells[self.row, self.col] = (self.word & 0xFF) | (contents << CONTENTS_SHIFT)
+        if self.safe_cells is not None:
+            if contents in (SAFE_UNVISITED, SAFE_VISITED):
+                self.safe_cells.add((self.x, self.y))
+            else:
+                self.safe_cells.discard((self.x, self.y))
+
+    # Sensory indicators as a list of on/offs, e.g., [on,off,off,off,off,off] which can be passed as L
+    def onoffs(self):
+        return list(ONOFFS[self.word & 0x3F])
+
+    # Clear the cell back to its default (unknown) state
+    def reset(self):
+        self.cells[self.row, self.col] = 0
+
+    # Symbols are only built when asked for, e.g., for printing
+    # Symbol 1: Confounded ('%' for On, '.' for Off)
+    # Symbol 2: Stench ('=' for On, '.' for Off)
+    # Symbol 3: Tingle ('T' for On, '.' for Off)
+    # Symbol 4: '-' if cell contains Agent or NPC else ' '
+    # Symbol 5:
+    # 'W' if cell contains (or possibly contains) Wumpus
+    # 'O' if cell contains (or possibly contains) Confundus Portal
+    # 'U' if cell possibly contains either Wumpus or Confundus Portal
+    # '^', '>', 'v', '<': Agent facing North, East, South, West directions
+    # 's' for non-visited safe cell (no Agent)
+    # 'S' for visited safe cell (no Agent)
+    # '?' if none of the above
+    # Symbol 6: '-' if cell contains Agent or NPC else ' '
+    # Symbol 7: Glitter ('*' for On, '.' for Off)
+    # Symbol 8: Bump ('B' for On, '.' for Off)
+    # Symbol 9: Scream ('@' for On, '.' for Off)
+    @property
+    def symbols(self):
+        return {str(k+1): symbol for k, symbol in enumerate(cell_symbols(self.word))}
+
+    # 3x3 square of symbols
+    @property
+    def square(self):
+        symbols = cell_symbols(self.word)
+        return [list(symbols[k:k+3]) for k in (0, 3, 6)]
+
+    @property
+    def indicators(self):
+        return {name: onoff for (name, _), onoff in zip(INDICATORS, ONOFFS[self.word & 0x3F])}
 
     def set_confounded(self):
-        self.indicators['Confounded'] = 'on'
-        self.symbols['1'] = '%'
-        self.update_square()
+        self.set_flags(CONFOUNDED)
 
     def unset_confounded(self):
-        self.indicators['Confounded'] = 'off'
-        self.symbols['1'] = '.'
-        self.update_square()
+        self.unset_flags(CONFOUNDED)
 
     def set_stench(self):
-        self.indicators['Stench'] = 'on'
-        self.symbols['2'] = '='
-        self.update_square()
+        self.set_flags(STENCH)
 
     def unset_stench(self):
-        self.indicators['Stench'] = 'off'
-        self.symbols['2'] = '.'
-        self.update_square()
+        self.unset_flags(STENCH)
 
     def set_tingle(self):
-        self.indicators['Tingle'] = 'on'
-        self.symbols['3'] = 'T'
-        self.update_square()
+        self.set_flags(TINGLE)
 
     def set_inhabited(self):
-        self.symbols['4'] = self.symbols['6'] = '-'
-        self.update_square()
+        self.set_flags(INHABITED)
 
     def unset_inhabited(self):
-        self.symbols['4'] = self.symbols['6'] = ' '
-        self.update_square()
+        self.unset_flags(INHABITED)
 
     def set_wumpus(self):
-        self.symbols['5'] = 'W'
-        self.update_square()
+        self.set_contents(WUMPUS)
 
     def set_portal(self):
-        self.symbols['5'] = 'O'
-        self.update_square()
-    
+        self.set_contents(PORTAL)
+
     def set_wumpus_or_portal(self):  # For relative map
-        self.symbols['5'] = 'U'
-        self.update_square()
+        self.set_contents(WUMPUS_OR_PORTAL)
 
     def set_north(self):
-        self.symbols['5'] = '^'
-        self.update_square()
+        self.set_contents(NORTH)
 
     def set_east(self):
-        self.symbols['5'] = '>'
-        self.update_square()
+        self.set_contents(EAST)
 
     def set_south(self):
-        self.symbols['5'] = 'v'
-        self.update_square()
+        self.set_contents(SOUTH)
 
     def set_west(self):
-        self.symbols['5'] = '<'
-        self.update_square()
+        self.set_contents(WEST)
+
+    # Absolute or relative direction, e.g., 'north' or 'rnorth'
+    def set_facing(self, direction):
+        self.set_contents(DIRECTIONS[direction])
 
     def set_unvisited_and_safe(self):
-        self.symbols['5'] = 's'
-        self.update_square()
+        self.set_contents(SAFE_UNVISITED)
 
     def set_visited_and_safe(self):
-        self.symbols['5'] = 'S'
-        self.update_square()
+        self.set_contents(SAFE_VISITED)
+
+    def is_safe(self):
+        return self.contents in (SAFE_UNVISITED, SAFE_VISITED)
 
     def set_glitter(self):
-        self.indicators['Glitter'] = 'on'
-        self.symbols['7'] = '*'
-        self.update_square()
+        self.set_flags(GLITTER)
 
     def unset_glitter(self):
-        self.indicators['Glitter'] = 'off'
-        self.symbols['7'] = '.'
-        self.update_square()
+        self.unset_flags(GLITTER)
 
     def set_bump(self):
-        self.indicators['Bump'] = 'on'
-        self.symbols['8'] = 'B'
-        self.update_square()
+        self.set_flags(BUMP)
 
     def unset_bump(self):
-        self.indicators['Bump'] = 'off'
-        self.symbols['8'] = '.'
-        self.update_square()
-    
+        self.unset_flags(BUMP)
+
     def set_scream(self):
-        self.indicators['Scream'] = 'on'
-        self.symbols['9'] = '@'
-        self.update_square()
+        self.set_flags(SCREAM)
 
     def unset_scream(self):
-        self.indicators['Scream'] = 'off'
-        self.symbols['9'] = '.'
-        self.update_square()
+        self.unset_flags(SCREAM)
+
+    # Turn Confounded, Bump and Scream Off, which only last for one action
+    def unset_temporary(self):
+        self.unset_flags(CONFOUNDED | BUMP | SCREAM)
 
     def set_wall(self):
-        for key in self.symbols.keys():
-            self.symbols[key] = '#'
-        self.update_square()
+        self.set_contents(WALL)
 
 
 # Class representing the actual Wumpus World
 # ====================================================================================================
 class AbsoluteWorld:
-    def __init__(self, layout):
+    def __init__(self, layout, rng=random):
+        self.rng = rng               # Random number generator for teleports
         self.width = len(layout[0])  # No. of columns
         self.height = len(layout)    # No. of rows
         self.start_x = None
         self.start_y = None
         self.start_direction = None
-        self.wumpus_alive = False    # Wumpus is dead until spawned 
+        self.wumpus_alive = False    # Wumpus is dead until spawned
         self.coins_at_start = 0
-        # Initialize absolute map with default MapCells first
-        self.grid = [[MapCell(j, self.height-1-i) for j in range(self.width)] for i in range(self.height)]  # MapCell(x, y)
-        # Update cells based on layout
-        for i in range(self.height):
-            for j in range(self.width):
-                if layout[i][j] == '#':
-                    self.grid[i][j].set_wall()
-                elif layout[i][j] == 'W':
-                    self.spawn_wumpus(i, j)
-                elif layout[i][j] == 'O':
-                    self.spawn_portal(i, j)
-                elif layout[i][j] == '*':
-                    self.spawn_coin(i, j)
-                elif layout[i][j] == '^':
-                    self.spawn_agent(i, j, 'north')
-                    self.start_x = j
-                    self.start_y = self.height-1-i
-                    self.start_direction = 'north'
-                elif layout[i][j] == '>':
-                    self.spawn_agent(i, j, 'east')
-                    self.start_x = j
-                    self.start_y = self.height-1-i
-                    self.start_direction = 'east'
-                elif layout[i][j] == 'v':
-                    self.spawn_agent(i, j, 'south')
-                    self.start_x = j
-                    self.start_y = self.height-1-i
-                    self.start_direction = 'south'
-                elif layout[i][j] == '<':
-                    self.spawn_agent(i, j, 'west')
-                    self.start_x = j
-                    self.start_y = self.height-1-i
-                    self.start_direction = 'west'
-                else:
-                    self.grid[i][j].set_unvisited_and_safe()
+        # Build all cells at once from boolean masks of the layout
+        layout = np.array(layout, dtype='<U1')
+        wall = layout == '#'
+        wumpus = layout == 'W'
+        portal = layout == 'O'
+        coin = layout == '*'
+        agent_directions = {'^': 'north', '>': 'east', 'v': 'south', '<': 'west'}
+        agent = np.isin(layout, list(agent_directions))
+        # Contents (symbol 5), any other cell is safe
+        contents = np.full(layout.shape, SAFE_UNVISITED, dtype=np.uint16)
+        contents[wall] = WALL
+        contents[wumpus] = WUMPUS
+        contents[portal] = PORTAL
+        # Sensory indicators
+        # Stench and Tingle are On in non-wall cells next to Wumpus and Confundus Portal respectively
+        stench = adjacent_mask(wumpus) & ~wall
+        tingle = adjacent_mask(portal) & ~wall
+        self.cells = contents << CONTENTS_SHIFT
+        self.cells[stench] |= STENCH
+        self.cells[tingle] |= TINGLE
+        self.cells[coin] |= GLITTER
+        self.cells[wumpus | portal | coin | agent] |= INHABITED
+        # Index of safe (unvisited or visited) cells as absolute (x, y), kept in sync by MapCell
+        rows, cols = np.nonzero(contents == SAFE_UNVISITED)
+        self.safe_cells = IndexedSet(zip(cols.tolist(), (self.height-1-rows).tolist()))
+        self.wumpus_alive = bool(wumpus.any())
+        self.coins_at_start = int(coin.sum())
+        # Agent (if more than one in layout, the last one counts)
+        for i, j in np.argwhere(agent).tolist():
+            self.spawn_agent(i, j, agent_directions[layout[i, j]])
+            self.start_x = j
+            self.start_y = self.height-1-i
+            self.start_direction = agent_directions[layout[i, j]]
         # Sensory indicators of absolute starting position
         self.start_indicators = self.get_start_indicators()
 
@@ -239,94 +651,78 @@ class AbsoluteWorld:
     def xy_to_rowcol(self, x, y):
         return self.height-1-y, x
 
+    # Copy of the state that changes as Agent acts in the world
+    def snapshot(self):
+        return self.cells.copy(), self.safe_cells.copy(), self.wumpus_alive
+
+    # Restore the state copied by snapshot() in place, so existing cell views stay valid
+    def restore(self, snapshot):
+        cells, safe_cells, self.wumpus_alive = snapshot
+        np.copyto(self.cells, cells)
+        self.safe_cells.items = safe_cells.items.copy()
+        self.safe_cells.positions = safe_cells.positions.copy()
+
+    # View of the cell at absolute row, column indices
+    def cell(self, row, col):
+        return MapCell(self.cells, row, col, col, self.height-1-row, self.safe_cells)
+
     def get_start_indicators(self):
         row, col = self.xy_to_rowcol(self.start_x, self.start_y)
-        return list(self.grid[row][col].indicators.values())
+        return self.cell(row, col).onoffs()
+
+    def render_map(self):
+        return render_cells(self.cells)
 
     def print_map(self):
-        for i in range(self.height):
-            squares = [self.grid[i][j].square for j in range(self.width)]
-            for k in range(3):
-                rows = [squares[s][k] for s in range(len(squares))]
-                for row in rows:
-                    print(f'{" ".join(row)} ', end=' ')
-                print()
-            print()
+        sys.stdout.write(self.render_map())
 
     def spawn_wumpus(self, row, col):
-        self.grid[row][col].set_wumpus()
-        self.grid[row][col].set_inhabited()
-        if self.grid[row-1][col].symbols['5'] != '#':
-            self.grid[row-1][col].set_stench()
-        if self.grid[row+1][col].symbols['5'] != '#':
-            self.grid[row+1][col].set_stench()
-        if self.grid[row][col-1].symbols['5'] != '#':
-            self.grid[row][col-1].set_stench()
-        if self.grid[row][col+1].symbols['5'] != '#':
-            self.grid[row][col+1].set_stench()
+        self.cell(row, col).set_wumpus()
+        self.cell(row, col).set_inhabited()
+        for row_n, col_n in ((row-1, col), (row+1, col), (row, col-1), (row, col+1)):
+            if self.cell(row_n, col_n).contents != WALL:
+                self.cell(row_n, col_n).set_stench()
         self.wumpus_alive = True
 
     def despawn_wumpus(self, row, col):
-        self.grid[row][col].unset_inhabited()
-        self.grid[row][col].set_unvisited_and_safe()
-        if self.grid[row-1][col].symbols['5'] != '#':
-            self.grid[row-1][col].unset_stench()
-        if self.grid[row+1][col].symbols['5'] != '#':
-            self.grid[row+1][col].unset_stench()
-        if self.grid[row][col-1].symbols['5'] != '#':
-            self.grid[row][col-1].unset_stench()
-        if self.grid[row][col+1].symbols['5'] != '#':
-            self.grid[row][col+1].unset_stench()
+        self.cell(row, col).unset_inhabited()
+        self.cell(row, col).set_unvisited_and_safe()
+        for row_n, col_n in ((row-1, col), (row+1, col), (row, col-1), (row, col+1)):
+            if self.cell(row_n, col_n).contents != WALL:
+                self.cell(row_n, col_n).unset_stench()
         self.wumpus_alive = False
 
     def spawn_portal(self, row, col):
-        self.grid[row][col].set_portal()
-        self.grid[row][col].set_inhabited()
-        if self.grid[row-1][col].symbols['5'] != '#':
-            self.grid[row-1][col].set_tingle()
-        if self.grid[row+1][col].symbols['5'] != '#':
-            self.grid[row+1][col].set_tingle()
-        if self.grid[row][col-1].symbols['5'] != '#':
-            self.grid[row][col-1].set_tingle()
-        if self.grid[row][col+1].symbols['5'] != '#':
-            self.grid[row][col+1].set_tingle()
+        self.cell(row, col).set_portal()
+        self.cell(row, col).set_inhabited()
+        for row_n, col_n in ((row-1, col), (row+1, col), (row, col-1), (row, col+1)):
+            if self.cell(row_n, col_n).contents != WALL:
+                self.cell(row_n, col_n).set_tingle()
 
     def spawn_coin(self, row, col):
-        self.grid[row][col].set_glitter()
-        self.grid[row][col].set_inhabited()
-        self.grid[row][col].set_unvisited_and_safe()
+        self.cell(row, col).set_glitter()
+        self.cell(row, col).set_inhabited()
+        self.cell(row, col).set_unvisited_and_safe()
         self.coins_at_start += 1
 
     def despawn_coin(self, row, col):
         # Check if coin exists in cell first
-        if self.grid[row][col].symbols['7'] == '*':
-            self.grid[row][col].unset_glitter()
+        if self.cell(row, col).has(GLITTER):
+            self.cell(row, col).unset_glitter()
             return True
         return False
 
     def spawn_agent(self, row, col, direction):
-        if direction == 'north':
-            self.grid[row][col].set_north()
-        if direction == 'east':
-            self.grid[row][col].set_east()
-        if direction == 'south':
-            self.grid[row][col].set_south()
-        if direction == 'west':
-            self.grid[row][col].set_west()
-        self.grid[row][col].set_inhabited()
+        self.cell(row, col).set_facing(direction)
+        self.cell(row, col).set_inhabited()
         # Confounded is On at the start of the game
-        self.grid[row][col].set_confounded()
+        self.cell(row, col).set_confounded()
 
     def teleport_agent(self):
         # Both unvisited and visited cells are considered safe
-        safe_xy_positions = []
-        for i in range(self.height):
-            for j in range(self.width):
-                if self.grid[i][j].symbols['5'] == 's' or self.grid[i][j].symbols['5'] == 'S':
-                    safe_xy_positions.append((j, self.height-1-i))
         # Randomly choose a safe absolute (x, y) and direction
-        x, y = random.choice(safe_xy_positions)
-        direction = random.choice(['north', 'east', 'south', 'west'])
+        x, y = self.safe_cells.choice(self.rng)
+        direction = self.rng.choice(['north', 'east', 'south', 'west'])
         # Move Agent to the chosen position
         row, col = self.xy_to_rowcol(x, y)
         self.spawn_agent(row, col, direction)
@@ -336,14 +732,24 @@ class AbsoluteWorld:
 # Class representing the world built by Agent using relative knowledge
 # ====================================================================================================
 class RelativeWorld:
-    def __init__(self):
+    def __init__(self, agent):
+        self.agent = agent  # AgentClient to query
         self.width = 3
         self.height = 3
         self.origin_x = 0
         self.origin_y = 0
         self.origin_direction = 'rnorth'
-        # Initialize relative map with default MapCells first
-        self.grid = [[MapCell(j-(self.width//2), (self.height//2)-i) for j in range(self.width)] for i in range(self.height)]  # MapCell(x, y)
+        # Localisation and mapping terms as of the last update, used to find changed cells
+        self.facts = {term: frozenset() for term in SNAPSHOT_TERMS}
+        # Agent's relative x, y, direction and temporary indicators as of the last update (set by init_agent)
+        self.agent_state = None
+        # Initialize relative map with default cells first
+        # Cells live in a buffer that grows by doubling, and self.cells is the view of the height x width map
+        # at row, column offsets top, left of the buffer, so that most growths of the map only move the view
+        self.buffer = np.zeros((self.height, self.width), dtype=np.uint16)
+        self.top = 0
+        self.left = 0
+        self.cells = self.buffer
         self.init_agent()
 
     # Convert relative row, column indices to relative x, y
@@ -360,18 +766,117 @@ class RelativeWorld:
         col_c = self.width // 2
         return row_c-y, col_c+x
 
-    def reset_grid(self):
-        self.grid = [[MapCell(j-(self.width//2), (self.height//2)-i) for j in range(self.width)] for i in range(self.height)]  # MapCell(x, y)
+    # View of the cell at relative row, column indices
+    def cell(self, row, col):
+        return MapCell(self.cells, row, col, *self.rowcol_to_xy(row, col))
+
+    # Grow the map after width/height changed, keeping existing cells around the center
+    # The map stays centered on the origin and grows by a ring of cells at a time, so it is not cropped to
+    # the cells Agent knows about; render_map() prints the whole height x width map, as the correctness
+    # test printouts expect
+    # Buffer cells outside the view are never written, so cells entering the view are default cells
+    # Only when the view outgrows the buffer is the map copied into a buffer twice its size, which keeps
+    # the cost of growing amortized constant per added cell
+    # Return the relative x, y positions of newly added cells
+    def resize(self):
+        old_height, old_width = self.cells.shape
+        # Row, column offsets of the old map in the new one
+        row_o = self.height//2 - old_height//2
+        col_o = self.width//2 - old_width//2
+        top = self.top - row_o
+        left = self.left - col_o
+        buffer_height, buffer_width = self.buffer.shape
+        fits_height = 0 <= top and top+self.height <= buffer_height
+        fits_width = 0 <= left and left+self.width <= buffer_width
+        if not (fits_height and fits_width):
+            if not fits_height:
+                buffer_height = 2*self.height
+            if not fits_width:
+                buffer_width = 2*self.width
+            buffer = np.zeros((buffer_height, buffer_width), dtype=np.uint16)
+            top = (buffer_height-self.height) // 2
+            left = (buffer_width-self.width) // 2
+            buffer[top+row_o:top+row_o+old_height, left+col_o:left+col_o+old_width] = self.cells
+            self.buffer = buffer
+        self.top = top
+        self.left = left
+        self.cells = self.buffer[top:top+self.height, left:left+self.width]
+
+        new_cells = []
+        for i in range(self.height):
+            if row_o <= i < row_o+old_height:
+                cols = itertools.chain(range(col_o), range(col_o+old_width, self.width))
+            else:
+                cols = range(self.width)
+            new_cells.extend(self.rowcol_to_xy(i, j) for j in cols)
+        return new_cells
+
+    # Apply a knowledge snapshot by repainting only the cells whose facts changed
+    # (plus the cells the Agent left and entered, and any newly added cells)
+    # Terms whose positions did not change keep the same frozenset (see AgentClient.snapshot), so only the
+    # terms that changed are compared
+    def apply_snapshot(self, position, facts, temp_indicators, new_cells=()):
+        x, y, direction = position
+        dirty = set(new_cells)
+        for term, positions in facts.items():
+            if positions is not self.facts[term]:
+                dirty |= positions ^ self.facts[term]
+        dirty.add(self.agent_state[:2])
+        dirty.add((x, y))
+        self.facts = facts
+        self.agent_state = (x, y, direction, temp_indicators)
+        for x, y in dirty:
+            row, col = self.xy_to_rowcol(x, y)
+            if 0 <= row < self.height and 0 <= col < self.width:
+                self.paint_cell(self.cell(row, col))
+
+    # Repaint a single cell from the current facts
+    def paint_cell(self, cell):
+        xy = (cell.x, cell.y)
+        cell.reset()
+        if xy in self.facts['safe']:
+            cell.set_unvisited_and_safe()
+        if xy in self.facts['visited']:
+            cell.set_visited_and_safe()
+        if xy in self.facts['wumpus']:
+            cell.set_wumpus()
+            cell.set_inhabited()
+        if xy in self.facts['confundus']:
+            # Check if cell possibly contains Wumpus also
+            if cell.contents == WUMPUS:
+                cell.set_wumpus_or_portal()
+            else:
+                cell.set_portal()
+            cell.set_inhabited()
+        if xy in self.facts['stench']:
+            cell.set_stench()
+        if xy in self.facts['tingle']:
+            cell.set_tingle()
+        if xy in self.facts['glitter']:
+            cell.set_glitter()
+            cell.set_inhabited()
+        if xy in self.facts['wall']:
+            cell.set_wall()
+
+        # Finally, place Agent on relative map
+        if self.agent_state and xy == self.agent_state[:2]:
+            self.place_agent(cell.row, cell.col, self.agent_state[2])
+            temp_indicators = self.agent_state[3]
+            if temp_indicators:
+                if temp_indicators[0] == 'on':
+                    cell.set_confounded()
+                if temp_indicators[1] == 'on':
+                    cell.set_bump()
+                if temp_indicators[2] == 'on':
+                    cell.set_scream()
+            else:
+                cell.set_confounded()
+
+    def render_map(self):
+        return render_cells(self.cells)
 
     def print_map(self):
-        for i in range(self.height):
-            squares = [self.grid[i][j].square for j in range(self.width)]
-            for k in range(3):
-                rows = [squares[s][k] for s in range(len(squares))]
-                for row in rows:
-                    print(f'{" ".join(row)} ', end=' ')
-                print()
-            print()
+        sys.stdout.write(self.render_map())
 
     # Initialize Agent due to reposition(L)
     def init_agent(self):
@@ -379,361 +884,319 @@ class RelativeWorld:
         # Agent should always return (0, 0) and relative north
         x, y, direction = self.get_agent_position()
         row, col = self.xy_to_rowcol(x, y)
-        if direction == 'rnorth':
-            self.grid[row][col].set_north()
-        if direction == 'reast':
-            self.grid[row][col].set_east()
-        if direction == 'rsouth':
-            self.grid[row][col].set_south()
-        if direction == 'rwest':
-            self.grid[row][col].set_west()
-        self.grid[row][col].set_inhabited()
+        cell = self.cell(row, col)
+        cell.set_facing(direction)
+        cell.set_inhabited()
         # Confounded is On automatically
-        self.grid[row][col].set_confounded()
+        cell.set_confounded()
         # Stench, Tingle, Glitter should be queried
-        if bool(list(prolog.query(f'stench({x},{y})'))):
-            self.grid[row][col].set_stench()
-        if bool(list(prolog.query(f'tingle({x},{y})'))):
-            self.grid[row][col].set_tingle()
-        if bool(list(prolog.query(f'glitter({x},{y})'))):
-            self.grid[row][col].set_glitter()
+        if self.agent.holds('stench', x, y):
+            cell.set_stench()
+        if self.agent.holds('tingle', x, y):
+            cell.set_tingle()
+        if self.agent.holds('glitter', x, y):
+            cell.set_glitter()
+        # The cell painted here is repainted by the first update, even if Agent left it
+        self.agent_state = (x, y, direction, None)
 
     # Get Agent's current relative position and direction via current(X,Y,D)
     def get_agent_position(self):
-        result = list(prolog.query('current(X,Y,D)'))
-        if result:
-            x = result[0].get('X')
-            y = result[0].get('Y')
-            direction = result[0].get('D')
-            return x, y, direction
+        return self.agent.current()
+
+    # Get Agent's current relative position and direction together with all localisation and mapping
+    # terms in one query, instead of one query for current(X,Y,D) and one for each term
+    # Return (x, y, direction) and a dict of term to frozenset of relative (x, y) positions
+    def get_snapshot(self):
+        return self.agent.snapshot()
 
     def place_agent(self, row, col, direction):
-        if direction == 'rnorth':
-            self.grid[row][col].set_north()
-        if direction == 'reast':
-            self.grid[row][col].set_east()
-        if direction == 'rsouth':
-            self.grid[row][col].set_south()
-        if direction == 'rwest':
-            self.grid[row][col].set_west()
-        self.grid[row][col].set_inhabited()
+        self.cell(row, col).set_facing(direction)
+        self.cell(row, col).set_inhabited()
+
+
+# Outcome of Simulator.step()
+# ====================================================================================================
+class StepResult:
+    __slots__ = ('percepts', 'moved', 'bumped', 'teleported', 'died', 'coin')
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.percepts = 0         # Sensory indicators after the action as a mask (bit i is L[i] of move(A,L))
+        self.moved = False        # Agent moved one cell ahead
+        self.bumped = False       # Agent bumped into a wall
+        self.teleported = False   # Agent stepped through a Confundus Portal
+        self.died = False         # Agent walked into Wumpus and the game was reset
+        self.coin = False         # Agent picked up a Coin
 
 
 # Class to simulate Agent's actions and their consequences in absolute world to generate percepts
 # and also to update relative map by querying Agent using localisation and mapping terms
 # ====================================================================================================
 class Simulator:
-    def __init__(self, layout):
+    def __init__(self, layout, seed=None, agent=None):
         # Initial absolute map layout
         self.abs_layout = layout
-        # Flag whether to return sensory indicators
-        self.return_indicators = True
+        # AgentClient of the Agent under test
+        self.agent = agent or default_agent
+        # Result of the last step(), reused by every step
+        self.result = StepResult()
+        self.step_actions = {
+            'moveforward': self.step_forward,
+            'turnleft': self.step_turn_left,
+            'turnright': self.step_turn_right,
+            'pickup': self.step_pickup,
+            'shoot': self.step_shoot,
+            'noop': self.step_noop
+        }
+        # Random number generator of this simulator (for teleports)
+        self.rng = random.Random(seed)
 
         # Absolute world
-        self.abs_world = AbsoluteWorld(layout)
+        self.abs_world = AbsoluteWorld(layout, self.rng)
         self.abs_x = self.abs_world.start_x                         # Agent's absolute x
         self.abs_y = self.abs_world.start_y                         # Agent's absolute y
         self.abs_direction = self.abs_world.start_direction         # Agent's absolute direction
         self.has_arrow = True
         self.coins_collected = 0
+        # State at the start of the game, restored instead of rebuilding the absolute world from the layout
+        self.start_state = self.snapshot()
 
         # Relative world
         self.relative_reposition(self.abs_world.start_indicators)   # Call reposition(L) first
-        self.rel_world = RelativeWorld()
+        self.rel_world = RelativeWorld(self.agent)
         self.rel_x = self.rel_world.origin_x                        # Agent's relative x
         self.rel_y = self.rel_world.origin_y                        # Agent's relative y
         self.rel_direction = self.rel_world.origin_direction        # Agent's relative direction
         self.rel_temp_indicators = None                             # Agent's relative temporary indicators
 
+        # Episode statistics
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.steps = 0      # No. of actions simulated
+        self.deaths = 0     # No. of times Agent walked into Wumpus
+        self.teleports = 0  # No. of times Agent stepped through a Confundus Portal
+
+    def stats(self):
+        return {
+            'coins_collected': self.coins_collected,
+            'coins_at_start': self.abs_world.coins_at_start,
+            'steps': self.steps,
+            'deaths': self.deaths,
+            'teleports': self.teleports
+        }
+
     # Absolute world related
     # ================================================================================================
-    def reset_absolute_world(self):
-        self.abs_world = AbsoluteWorld(self.abs_layout)
-        self.abs_x = self.abs_world.start_x
-        self.abs_y = self.abs_world.start_y
-        self.abs_direction = self.abs_world.start_direction
-        self.has_arrow = True
-        self.coins_collected = 0
+    # Copy of the absolute world and Agent's absolute state, including the state of the random number
+    # generator
+    def snapshot(self):
+        return {
+            'world': self.abs_world.snapshot(),
+            'pose': (self.abs_x, self.abs_y, self.abs_direction),
+            'has_arrow': self.has_arrow,
+            'coins_collected': self.coins_collected,
+            'rng': self.rng.getstate()
+        }
 
-    def move_forward(self):
-        self.return_indicators = True  # Reset flag
-        # Save Agent's absolute x, y and row, column indices before the move
-        abs_x_s, abs_y_s = self.abs_x, self.abs_y
-        row_s, col_s = self.abs_world.xy_to_rowcol(abs_x_s, abs_y_s)
+    # Restore a snapshot, leaving the random number generator as it is unless rewind_rng
+    def restore(self, snapshot, rewind_rng=True):
+        self.abs_world.restore(snapshot['world'])
+        self.abs_x, self.abs_y, self.abs_direction = snapshot['pose']
+        self.has_arrow = snapshot['has_arrow']
+        self.coins_collected = snapshot['coins_collected']
+        if rewind_rng:
+            self.rng.setstate(snapshot['rng'])
+
+    # Reset the absolute world to the start of the game
+    # A new correctness test rewinds the random number generator too, so that every test sees the same
+    # teleports however many tests ran before it, but a new game after a death does not
+    def reset_absolute_world(self, rewind_rng=True):
+        self.restore(self.start_state, rewind_rng)
+
+    # Simulate one action in the absolute world, without printing anything or calling Agent
+    # Actions are those of move(A,L), plus 'noop' (nothing happens)
+    # Return the StepResult of the action, which is the same object on every call
+    def step(self, action):
+        result = self.result
+        result.clear()
+        row, col = self.abs_world.xy_to_rowcol(self.abs_x, self.abs_y)
+        cell = self.abs_world.cell(row, col)
         # Turn Confounded, Bump and Scream Off if they were On previously
-        if self.abs_world.grid[row_s][col_s].symbols['1'] == '%':
-            self.abs_world.grid[row_s][col_s].unset_confounded()
-        if self.abs_world.grid[row_s][col_s].symbols['8'] == 'B':
-            self.abs_world.grid[row_s][col_s].unset_bump()
-        if self.abs_world.grid[row_s][col_s].symbols['9'] == '@':
-            self.abs_world.grid[row_s][col_s].unset_scream()
-
-        # Update Agent's absolute x, y based on direction
-        if self.abs_direction == 'north':
-            # Get absolute row, column indices of one cell ahead
-            row_d, col_d = self.abs_world.xy_to_rowcol(self.abs_x, self.abs_y+1)
-            if self.safe_moveforward(row_s, col_s, row_d, col_d):
-                self.abs_y += 1
-        elif self.abs_direction == 'east':
-            row_d, col_d = self.abs_world.xy_to_rowcol(self.abs_x+1, self.abs_y)
-            if self.safe_moveforward(row_s, col_s, row_d, col_d):
-                self.abs_x += 1
-        elif self.abs_direction == 'south':
-            row_d, col_d = self.abs_world.xy_to_rowcol(self.abs_x, self.abs_y-1)
-            if self.safe_moveforward(row_s, col_s, row_d, col_d):
-                self.abs_y -= 1
-        elif self.abs_direction == 'west':
-            row_d, col_d = self.abs_world.xy_to_rowcol(self.abs_x-1, self.abs_y)
-            if self.safe_moveforward(row_s, col_s, row_d, col_d):
-                self.abs_x -= 1
+        cell.unset_temporary()
 
-        row, col = self.abs_world.xy_to_rowcol(self.abs_x, self.abs_y)
-        indicators = list(self.abs_world.grid[row][col].indicators.values())
-        self.update_rel_temp_indicators(indicators)
-        print(onoff_to_name(indicators))
+        self.step_actions[action](row, col, cell, result)
 
-        # Return sensory indicators of cell that Agent is in after the action
-        # e.g., [on,off,off,off,off,off] which will be passed as L for move(A,L)
-        # However, if reposition(L) was called inside safe_moveforward due to Wumpus/Confundus Portal
-        # then return None to differentiate between whether need to call move(A,L) or not
-        if self.return_indicators:
-            return indicators
+        # Sensory indicators of cell that Agent is in after the action
+        row, col = self.abs_world.xy_to_rowcol(self.abs_x, self.abs_y)
+        result.percepts = int(self.abs_world.cells[row, col]) & 0x3F
+        return result
 
-    def safe_moveforward(self, row_s, col_s, row_d, col_d):
-        # A moveforward is safe only if Agent can move one cell ahead successfully
-        # row_s, col_s: Absolute row, column indices of cell Agent is currently in
-        # row_d, col_d: Absolute row, column indices of one cell ahead
+    # A moveforward is safe only if Agent can move one cell ahead successfully
+    # row, col: Absolute row, column indices of cell Agent is currently in
+    def step_forward(self, row, col, cell, result):
+        drow, dcol = AHEAD_OF[self.abs_direction]
+        cell_d = self.abs_world.cell(row+drow, col+dcol)
+        contents_d = cell_d.contents
 
         # If next cell is a wall, Agent remains in same cell but Bump is On
-        if self.abs_world.grid[row_d][col_d].symbols['5'] == '#':
-            self.abs_world.grid[row_s][col_s].set_bump()
+        if contents_d == WALL:
+            cell.set_bump()
+            result.bumped = True
 
         # If next cell is Confundus Portal, teleport Agent
-        elif self.abs_world.grid[row_d][col_d].symbols['5'] == 'O':
-            self.abs_world.grid[row_s][col_s].set_visited_and_safe()
+        elif contents_d == PORTAL:
+            self.teleports += 1
+            cell.set_visited_and_safe()
             # To account for when Agent did not pick up Coin in previous cell
-            if self.abs_world.grid[row_s][col_s].symbols['7'] == '.':
-                self.abs_world.grid[row_s][col_s].unset_inhabited()
+            if not cell.has(GLITTER):
+                cell.unset_inhabited()
             # Update Agent's absolute position and direction after teleporting
             self.abs_x, self.abs_y, self.abs_direction = self.abs_world.teleport_agent()
-            # Reset Agent's relative position and direction via reposition(L)
-            row, col = self.abs_world.xy_to_rowcol(self.abs_x, self.abs_y)
-            indicators_after_teleport = list(self.abs_world.grid[row][col].indicators.values())
-            self.reset_relative_world(indicators_after_teleport) # reposition(L) is called here
-            # reposition(L) was called so no need to return L for move(A,L)
-            self.return_indicators = False
-        
+            result.teleported = True
+
         # If next cell is Wumpus, reset the game
-        elif self.abs_world.grid[row_d][col_d].symbols['5'] == 'W':
-            self.reset_absolute_world()
-            self.relative_reborn()  # reborn is called here
-            self.reset_relative_world(self.abs_world.start_indicators)  # reposition(L) is called here
-            # reposition(L) was called so no need to return L for move(A,L)
-            self.return_indicators = False
+        elif contents_d == WUMPUS:
+            self.deaths += 1
+            self.reset_absolute_world(rewind_rng=False)
+            result.died = True
 
         # If next cell is safe, Agent moves one cell ahead
-        elif self.abs_world.grid[row_d][col_d].symbols['5'] == 's' or self.abs_world.grid[row_d][col_d].symbols['5'] == 'S':
-            if self.abs_direction == 'north':
-                self.abs_world.grid[row_d][col_d].set_north()
-            if self.abs_direction == 'east':
-                self.abs_world.grid[row_d][col_d].set_east()
-            if self.abs_direction == 'south':
-                self.abs_world.grid[row_d][col_d].set_south()
-            if self.abs_direction == 'west':
-                self.abs_world.grid[row_d][col_d].set_west()
-            self.abs_world.grid[row_d][col_d].set_inhabited()
-            self.abs_world.grid[row_s][col_s].set_visited_and_safe()
+        elif cell_d.is_safe():
+            cell_d.set_facing(self.abs_direction)
+            cell_d.set_inhabited()
+            cell.set_visited_and_safe()
             # To account for when Agent did not pick up Coin in previous cell
-            if self.abs_world.grid[row_s][col_s].symbols['7'] == '.':
-                self.abs_world.grid[row_s][col_s].unset_inhabited()
-            return True
-
-        return False
-
-    def turn_left(self):
-        row, col = self.abs_world.xy_to_rowcol(self.abs_x, self.abs_y)
-        # Turn Confounded, Bump and Scream Off if they were On previously
-        if self.abs_world.grid[row][col].symbols['1'] == '%':
-            self.abs_world.grid[row][col].unset_confounded()
-        if self.abs_world.grid[row][col].symbols['8'] == 'B':
-            self.abs_world.grid[row][col].unset_bump()
-        if self.abs_world.grid[row][col].symbols['9'] == '@':
-            self.abs_world.grid[row][col].unset_scream()
-
-        if self.abs_direction == 'north':
-            self.abs_direction = 'west'
-            self.abs_world.grid[row][col].set_west()
-        elif self.abs_direction == 'east':
-            self.abs_direction = 'north'
-            self.abs_world.grid[row][col].set_north()
-        elif self.abs_direction == 'south':
-            self.abs_direction = 'east'
-            self.abs_world.grid[row][col].set_east()
-        elif self.abs_direction == 'west':
-            self.abs_direction = 'south'
-            self.abs_world.grid[row][col].set_south()
-
-        indicators = list(self.abs_world.grid[row][col].indicators.values())
-        self.update_rel_temp_indicators(indicators)
-        print(onoff_to_name(indicators))
-
-        return indicators
+            if not cell.has(GLITTER):
+                cell.unset_inhabited()
+            self.abs_x += dcol
+            self.abs_y -= drow
+            result.moved = True
 
-    def turn_right(self):
-        row, col = self.abs_world.xy_to_rowcol(self.abs_x, self.abs_y)
-        # Turn Confounded, Bump and Scream Off if they were On previously
-        if self.abs_world.grid[row][col].symbols['1'] == '%':
-            self.abs_world.grid[row][col].unset_confounded()
-        if self.abs_world.grid[row][col].symbols['8'] == 'B':
-            self.abs_world.grid[row][col].unset_bump()
-        if self.abs_world.grid[row][col].symbols['9'] == '@':
-            self.abs_world.grid[row][col].unset_scream()
-
-        if self.abs_direction == 'north':
-            self.abs_direction = 'east'
-            self.abs_world.grid[row][col].set_east()
-        elif self.abs_direction == 'east':
-            self.abs_direction = 'south'
-            self.abs_world.grid[row][col].set_south()
-        elif self.abs_direction == 'south':
-            self.abs_direction = 'west'
-            self.abs_world.grid[row][col].set_west()
-        elif self.abs_direction == 'west':
-            self.abs_direction = 'north'
-            self.abs_world.grid[row][col].set_north()
-
-        indicators = list(self.abs_world.grid[row][col].indicators.values())
-        self.update_rel_temp_indicators(indicators)
-        print(onoff_to_name(indicators))
+    def step_turn_left(self, row, col, cell, result):
+        self.abs_direction = LEFT_OF[self.abs_direction]
+        cell.set_facing(self.abs_direction)
 
-        return indicators
+    def step_turn_right(self, row, col, cell, result):
+        self.abs_direction = RIGHT_OF[self.abs_direction]
+        cell.set_facing(self.abs_direction)
 
-    def pickup_coin(self):
-        row, col = self.abs_world.xy_to_rowcol(self.abs_x, self.abs_y)
-        # Turn Confounded, Bump and Scream Off if they were On previously
-        if self.abs_world.grid[row][col].symbols['1'] == '%':
-            self.abs_world.grid[row][col].unset_confounded()
-        if self.abs_world.grid[row][col].symbols['8'] == 'B':
-            self.abs_world.grid[row][col].unset_bump()
-        if self.abs_world.grid[row][col].symbols['9'] == '@':
-            self.abs_world.grid[row][col].unset_scream()
-        
+    def step_pickup(self, row, col, cell, result):
         if self.abs_world.despawn_coin(row, col):
             self.coins_collected += 1
+            result.coin = True
 
-        indicators = list(self.abs_world.grid[row][col].indicators.values())
+    def step_shoot(self, row, col, cell, result):
+        if self.has_arrow:
+            self.has_arrow = False
+            # Wumpus hit last in the arrow's direction, up to (but excluding) the outer wall
+            drow, dcol = AHEAD_OF[self.abs_direction]
+            hit = None
+            row_a, col_a = row+drow, col+dcol
+            while 0 < row_a < self.abs_world.height-1 and 0 < col_a < self.abs_world.width-1:
+                if self.abs_world.cell(row_a, col_a).contents == WUMPUS:
+                    hit = row_a, col_a
+                row_a, col_a = row_a+drow, col_a+dcol
+            if hit:
+                self.abs_world.despawn_wumpus(*hit)
+                cell.set_scream()
+
+    def step_noop(self, row, col, cell, result):
+        pass
+
+    # Verbose actions used by TestAgent
+    # They print the sensory indicators of cell that Agent is in after the action and return them,
+    # e.g., [on,off,off,off,off,off] which will be passed as L for move(A,L)
+    def report_percepts(self, result):
+        indicators = list(ONOFFS[result.percepts])
         self.update_rel_temp_indicators(indicators)
         print(onoff_to_name(indicators))
-        
         return indicators
 
-    def shoot_arrow(self):
-        row, col = self.abs_world.xy_to_rowcol(self.abs_x, self.abs_y)
-        # Turn Confounded, Bump and Scream Off if they were On previously
-        if self.abs_world.grid[row][col].symbols['1'] == '%':
-            self.abs_world.grid[row][col].unset_confounded()
-        if self.abs_world.grid[row][col].symbols['8'] == 'B':
-            self.abs_world.grid[row][col].unset_bump()
-        if self.abs_world.grid[row][col].symbols['9'] == '@':
-            self.abs_world.grid[row][col].unset_scream()
+    def move_forward(self):
+        result = self.step('moveforward')
+        if result.teleported:
+            if self.agent.trace:
+                self.agent.trace.record('teleport', self.abs_x, self.abs_y, self.abs_direction)
+            # Reset Agent's relative position and direction via reposition(L)
+            self.reset_relative_world(list(ONOFFS[result.percepts]))  # reposition(L) is called here
+        elif result.died:
+            self.relative_reborn()  # reborn is called here
+            self.reset_relative_world(self.abs_world.start_indicators)  # reposition(L) is called here
+        indicators = self.report_percepts(result)
+
+        # However, if reposition(L) was called due to Wumpus/Confundus Portal
+        # then return None to differentiate between whether need to call move(A,L) or not
+        if not (result.teleported or result.died):
+            return indicators
+
+    def turn_left(self):
+        return self.report_percepts(self.step('turnleft'))
+
+    def turn_right(self):
+        return self.report_percepts(self.step('turnright'))
 
+    def pickup_coin(self):
+        return self.report_percepts(self.step('pickup'))
+
+    def shoot_arrow(self):
         # Let the arrow "fly" only if Agent has it in both absolute and relative world
         # Confirm in relative world by querying hasarrow
-        if self.has_arrow and bool(list(prolog.query('hasarrow'))):
-            self.has_arrow = False
-            wumpus_hit = False
-            # Check if Wumpus is present in the arrow's direction
-            if self.abs_direction == 'north':
-                for i in range(row-1, 0, -1):
-                    if self.abs_world.grid[i][col].symbols['5'] == 'W':
-                        wumpus_hit = True
-                        row_w, col_w = i, col  # Save Wumpus's absolute position
-            if self.abs_direction == 'south':
-                for i in range(row+1, self.abs_world.height-1):
-                    if self.abs_world.grid[i][col].symbols['5'] == 'W':
-                        wumpus_hit = True
-                        row_w, col_w = i, col
-            if self.abs_direction == 'east':
-                for j in range(col+1, self.abs_world.width-1):
-                    if self.abs_world.grid[row][j].symbols['5'] == 'W':
-                        wumpus_hit = True
-                        row_w, col_w = row, j
-            if self.abs_direction == 'west':
-                for j in range(col-1, 0, -1):
-                    if self.abs_world.grid[row][j].symbols['5'] == 'W':
-                        wumpus_hit = True
-                        row_w, col_w = row, j
-            if wumpus_hit:
-                self.abs_world.despawn_wumpus(row_w, col_w)
-                self.abs_world.grid[row][col].set_scream()
-
-        indicators = list(self.abs_world.grid[row][col].indicators.values())
-        self.update_rel_temp_indicators(indicators)
-        print(onoff_to_name(indicators))
-        
-        return indicators
+        if self.has_arrow and self.agent.holds('hasarrow'):
+            return self.report_percepts(self.step('shoot'))
+        return self.report_percepts(self.step('noop'))
 
     # Decide next action sequence for Agent when it reasons to stay at same cell
     # due to adjacent cells being unsafe during explore(L)
+    # Breadth-first search over (row, column, direction) through safe cells, where moving forward and
+    # turning cost one action each, for the shortest action sequence to the nearest other cell that is safe
+    # and unvisited or still holds a Coin, followed by a pickup if it holds a Coin (Agent may have passed the
+    # Coin before without picking it up, and would otherwise be led back and forth between Coins)
+    # If no such cell can be reached, every cell Agent can safely get to has been visited and emptied, so no
+    # forced action can help it on and AgentStuck is raised
     def get_next_action_sequence(self):
         row, col = self.abs_world.xy_to_rowcol(self.abs_x, self.abs_y)
-        # Find a safe adjacent cell for Agent to move to using absolute map knowledge
-        # Priority order in checking will be forward, leftward, rightward, backward
-        if self.abs_direction == 'north':
-            if self.abs_world.grid[row-1][col].symbols['5'] == 's' or self.abs_world.grid[row-1][col].symbols['5'] == 'S':
-                return ['moveforward']
-            elif self.abs_world.grid[row][col-1].symbols['5'] == 's' or self.abs_world.grid[row][col-1].symbols['5'] == 'S':
-                return ['turnleft', 'moveforward']
-            elif self.abs_world.grid[row][col+1].symbols['5'] == 's' or self.abs_world.grid[row][col+1].symbols['5'] == 'S':
-                return ['turnright', 'moveforward']
-            elif self.abs_world.grid[row+1][col].symbols['5'] == 's' or self.abs_world.grid[row+1][col].symbols['5'] == 'S':
-                return ['turnleft', 'turnleft', 'moveforward']
-        
-        if self.abs_direction == 'east':
-            if self.abs_world.grid[row][col+1].symbols['5'] == 's' or self.abs_world.grid[row][col+1].symbols['5'] == 'S':
-                return ['moveforward']
-            elif self.abs_world.grid[row-1][col].symbols['5'] == 's' or self.abs_world.grid[row-1][col].symbols['5'] == 'S':
-                return ['turnleft', 'moveforward']
-            elif self.abs_world.grid[row+1][col].symbols['5'] == 's' or self.abs_world.grid[row+1][col].symbols['5'] == 'S':
-                return ['turnright', 'moveforward']
-            elif self.abs_world.grid[row][col-1].symbols['5'] == 's' or self.abs_world.grid[row][col-1].symbols['5'] == 'S':
-                return ['turnleft', 'turnleft', 'moveforward']
-
-        if self.abs_direction == 'south':
-            if self.abs_world.grid[row+1][col].symbols['5'] == 's' or self.abs_world.grid[row+1][col].symbols['5'] == 'S':
-                return ['moveforward']
-            elif self.abs_world.grid[row][col+1].symbols['5'] == 's' or self.abs_world.grid[row][col+1].symbols['5'] == 'S':
-                return ['turnleft', 'moveforward']
-            elif self.abs_world.grid[row][col-1].symbols['5'] == 's' or self.abs_world.grid[row][col-1].symbols['5'] == 'S':
-                return ['turnright', 'moveforward']
-            elif self.abs_world.grid[row-1][col].symbols['5'] == 's' or self.abs_world.grid[row-1][col].symbols['5'] == 'S':
-                return ['turnleft', 'turnleft', 'moveforward']
-
-        if self.abs_direction == 'west':
-            if self.abs_world.grid[row][col-1].symbols['5'] == 's' or self.abs_world.grid[row][col-1].symbols['5'] == 'S':
-                return ['moveforward']
-            elif self.abs_world.grid[row+1][col].symbols['5'] == 's' or self.abs_world.grid[row+1][col].symbols['5'] == 'S':
-                return ['turnleft', 'moveforward']
-            elif self.abs_world.grid[row-1][col].symbols['5'] == 's' or self.abs_world.grid[row-1][col].symbols['5'] == 'S':
-                return ['turnright', 'moveforward']
-            elif self.abs_world.grid[row][col+1].symbols['5'] == 's' or self.abs_world.grid[row][col+1].symbols['5'] == 'S':
-                return ['turnleft', 'turnleft', 'moveforward']
+        start = (row, col, self.abs_direction)
+        previous = {start: None}  # State -> (previous state, action)
+        frontier = collections.deque([start])
+        while frontier:
+            state = frontier.popleft()
+            row_s, col_s, direction = state
+            cell = self.abs_world.cell(row_s, col_s)
+            if (row_s, col_s) != (row, col) and (cell.contents == SAFE_UNVISITED or cell.has(GLITTER)):
+                action_sequence = ['pickup'] if cell.has(GLITTER) else []
+                while previous[state]:
+                    state, action = previous[state]
+                    action_sequence.append(action)
+                return action_sequence[::-1]
+            drow, dcol = AHEAD_OF[direction]
+            for action, next_state in (('moveforward', (row_s+drow, col_s+dcol, direction)),
+                    ('turnleft', (row_s, col_s, LEFT_OF[direction])), ('turnright', (row_s, col_s, RIGHT_OF[direction]))):
+                if next_state in previous:
+                    continue
+                if action == 'moveforward' and not self.abs_world.cell(next_state[0], next_state[1]).is_safe():
+                    continue
+                previous[next_state] = (state, action)
+                frontier.append(next_state)
+        raise AgentStuck('No safe unvisited cell or Coin can be reached')
 
     # Relative world related
     # ================================================================================================
     def reset_relative_world(self, indicators):
         self.relative_reposition(indicators)
-        self.rel_world = RelativeWorld()
+        self.rel_world = RelativeWorld(self.agent)
         self.rel_x = self.rel_world.origin_x
         self.rel_y = self.rel_world.origin_y
         self.rel_direction = self.rel_world.origin_direction
         self.rel_temp_indicators = None
 
     def relative_reborn(self):
-        list(prolog.query('reborn'))
+        self.agent.reborn()
 
     def relative_reposition(self, indicators):
-        list(prolog.query(f'reposition({indicators})'))
+        self.agent.reposition(indicators)
 
     def update_rel_temp_indicators(self, indicators):
         # [Confounded, Bump, Scream]
@@ -742,10 +1205,11 @@ class Simulator:
     def update_relative_map(self):
         # Save Agent's relative position and direction (just in case) before the action
         old_rel_x, old_rel_y, old_rel_direction = self.rel_x, self.rel_y, self.rel_direction
-        # Update Agent's relative position and direction via current(X,Y,D)
-        self.rel_x, self.rel_y, self.rel_direction = self.rel_world.get_agent_position()
+        # Update Agent's relative position and direction, together with its whole relative knowledge
+        (self.rel_x, self.rel_y, self.rel_direction), facts = self.rel_world.get_snapshot()
 
         # Consider expanding relative map only if Agent moved by one cell
+        old_width, old_height = self.rel_world.width, self.rel_world.height
         if (self.rel_x, self.rel_y) != (old_rel_x, old_rel_y):
             # If one cell ahead of Agent's cell is out of bounds in relative map
             # then it should expand accordingly based on Agent's relative direction
@@ -765,156 +1229,169 @@ class Simulator:
                 row, col = self.rel_world.xy_to_rowcol(self.rel_x-1, self.rel_y)
                 if col < 0:
                     self.rel_world.width += 2
+        new_cells = []
+        if (self.rel_world.width, self.rel_world.height) != (old_width, old_height):
+            new_cells = self.rel_world.resize()
 
-        # Reset relative map grid to start from a clean state
-        self.rel_world.reset_grid()
-
-        # Update map cells by querying Agent using localisation and mapping terms
-        # Using big X and Y, each term will return all relevant relative x, y positions
-        # which are then used to update the symbols of each map cell accordingly
-        # safe(X,Y)
-        # print('safe(X,Y):', end=' ')
-        results = sorted(list(prolog.query('safe(X,Y)')), key=lambda d: d['X'])
-        for result in results:
-            # print(result, end=', ')
-            x, y = result.get('X'), result.get('Y')
-            row, col = self.rel_world.xy_to_rowcol(x, y)
-            self.rel_world.grid[row][col].set_unvisited_and_safe()
-        # print()
-
-        # visited(X,Y)
-        # print('visited(X,Y):', end=' ')
-        results = sorted(list(prolog.query('visited(X,Y)')), key=lambda d: d['X'])
-        for result in results:
-            # print(result, end=', ')
-            x, y = result.get('X'), result.get('Y')
-            row, col = self.rel_world.xy_to_rowcol(x, y)
-            self.rel_world.grid[row][col].set_visited_and_safe()
-        # print()
-
-        # wumpus(X,Y)
-        # print('wumpus(X,Y):', end=' ')
-        results = sorted(list(prolog.query('wumpus(X,Y)')), key=lambda d: d['X'])
-        for result in results:
-            # print(result, end=', ')
-            x, y = result.get('X'), result.get('Y')
-            row, col = self.rel_world.xy_to_rowcol(x, y)
-            self.rel_world.grid[row][col].set_wumpus()
-            self.rel_world.grid[row][col].set_inhabited()
-        # print()
-
-        # confundus(X,Y)
-        # print('confundus(X,Y):', end=' ')
-        results = sorted(list(prolog.query('confundus(X,Y)')), key=lambda d: d['X'])
-        for result in results:
-            # print(result, end=', ')
-            x, y = result.get('X'), result.get('Y')
-            row, col = self.rel_world.xy_to_rowcol(x, y)
-            # Check if cell possibly contains Wumpus also
-            if self.rel_world.grid[row][col].symbols['5'] == 'W':
-                self.rel_world.grid[row][col].set_wumpus_or_portal()
-            else:
-                self.rel_world.grid[row][col].set_portal()
-            self.rel_world.grid[row][col].set_inhabited()
-        # print()
-
-        # stench(X,Y)
-        # print('stench(X,Y):', end=' ')
-        results = sorted(list(prolog.query('stench(X,Y)')), key=lambda d: d['X'])
-        for result in results:
-            # print(result, end=', ')
-            x, y = result.get('X'), result.get('Y')
-            row, col = self.rel_world.xy_to_rowcol(x, y)
-            self.rel_world.grid[row][col].set_stench()
-        # print()
-
-        # tingle(X,Y)
-        # print('tingle(X,Y):', end=' ')
-        results = sorted(list(prolog.query('tingle(X,Y)')), key=lambda d: d['X'])
-        for result in results:
-            # print(result, end=', ')
-            x, y = result.get('X'), result.get('Y')
-            row, col = self.rel_world.xy_to_rowcol(x, y)
-            self.rel_world.grid[row][col].set_tingle()
-        # print()
-
-        # glitter(X,Y)
-        # print('glitter(X,Y):', end=' ')
-        results = sorted(list(prolog.query('glitter(X,Y)')), key=lambda d: d['X'])
-        for result in results:
-            # print(result, end=', ')
-            x, y = result.get('X'), result.get('Y')
-            row, col = self.rel_world.xy_to_rowcol(x, y)
-            self.rel_world.grid[row][col].set_glitter()
-            self.rel_world.grid[row][col].set_inhabited()
-        # print()
-
-        # wall(X,Y)
-        # print('wall(X,Y):', end=' ')
-        results = sorted(list(prolog.query('wall(X,Y)')), key=lambda d: d['X'])
-        for result in results:
-            # print(result, end=', ')
-            x, y = result.get('X'), result.get('Y')
-            row, col = self.rel_world.xy_to_rowcol(x, y)
-            self.rel_world.grid[row][col].set_wall()
-        # print()
-        # print()
+        # Update only the map cells whose localisation and mapping terms changed since the last update
+        position = self.rel_x, self.rel_y, self.rel_direction
+        self.rel_world.apply_snapshot(position, facts, self.rel_temp_indicators, new_cells)
 
-        # Finally, place Agent on relative map
-        row, col = self.rel_world.xy_to_rowcol(self.rel_x, self.rel_y)
-        self.rel_world.place_agent(row, col, self.rel_direction)
-        if self.rel_temp_indicators:
-            if self.rel_temp_indicators[0] == 'on':
-                self.rel_world.grid[row][col].set_confounded()
-            if self.rel_temp_indicators[1] == 'on':
-                self.rel_world.grid[row][col].set_bump()
-            if self.rel_temp_indicators[2] == 'on':
-                self.rel_world.grid[row][col].set_scream()
-        else:
-            self.rel_world.grid[row][col].set_confounded()
+
+# Class to decide when maps are rendered
+# ====================================================================================================
+class MapRenderer:
+    # Render policies
+    # 'always': Print every map as soon as it is drawn
+    # 'never': Do not render maps at all (headless)
+    # 'failure': Keep the maps of the current test in memory and print them only if the test fails
+    # 'every': Print every n-th map only
+    # 'ring': Keep the last n maps in memory and print them on flush()
+    # 'delta': Write a keyframe and then only changed cells of each map as JSON lines to frames_path
+    # (see frames.py to rebuild the full maps)
+    POLICIES = ('always', 'never', 'failure', 'every', 'ring', 'delta')
+
+    def __init__(self, policy='always', n=1, frames_path=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f'Unknown render policy {policy!r}, expected one of {self.POLICIES}')
+        if n < 1:
+            raise ValueError(f'n must be at least 1, got {n}')
+        self.policy = policy
+        self.n = n
+        self.count = 0  # No. of maps drawn so far
+        self.frames = collections.deque(maxlen=n if policy == 'ring' else None)
+        self.delta_writer = None
+        if policy == 'delta':
+            if not frames_path:
+                raise ValueError('The delta render policy needs a frames_path')
+            self.delta_writer = DeltaFrameWriter(frames_path, cell_symbols)
+
+    # Draw the map of an AbsoluteWorld or RelativeWorld according to the policy
+    def frame(self, world):
+        self.count += 1
+        if self.policy == 'always' or (self.policy == 'every' and self.count % self.n == 0):
+            sys.stdout.write(world.render_map())
+        elif self.policy in ('failure', 'ring'):
+            self.frames.append(world.render_map())
+        elif self.policy == 'delta':
+            self.delta_writer.write(world)
+
+    # Print (and forget) all maps kept in memory
+    def flush(self):
+        if self.frames:
+            sys.stdout.write(''.join(self.frames))
+            self.frames.clear()
+        if self.delta_writer:
+            self.delta_writer.file.flush()
+
+    # Flush, and close the delta-frame file
+    def close(self):
+        self.flush()
+        if self.delta_writer:
+            self.delta_writer.close()
+
+    def test_passed(self):
+        if self.policy == 'failure':
+            self.frames.clear()
+
+    def test_failed(self):
+        if self.policy == 'failure':
+            self.flush()
+
+
+# Decorator for TestAgent tests to let the renderer know whether the test passed or failed
+def rendered_test(test):
+    @functools.wraps(test)
+    def wrapper(self, *args, **kwargs):
+        try:
+            result = test(self, *args, **kwargs)
+        except BaseException:
+            self.renderer.test_failed()
+            raise
+        self.renderer.test_passed()
+        return result
+    return wrapper
+
+
+# Decorator for TestAgent tests to profile each test on its own (and mark its start in the trace)
+def profiled_test(test):
+    @functools.wraps(test)
+    def wrapper(self, *args, **kwargs):
+        agent = self.simulator.agent
+        agent.profiler.reset()
+        if agent.trace:
+            agent.trace.record('test', test.__name__)
+        try:
+            return test(self, *args, **kwargs)
+        finally:
+            self.profiles[test.__name__] = agent.profiler.report()
+            if self.print_profile:
+                sys.stdout.write(agent.profiler.format_report(test.__name__))
+    return wrapper
 
 
 # Class to test correctness of Agent capabilities
 # ====================================================================================================
 class TestAgent:
-    def __init__(self, simulator: Simulator):
+    def __init__(self, simulator: Simulator, renderer=None, print_profile=False, budget=None):
         self.simulator = simulator
+        self.renderer = renderer or MapRenderer()
+        # Print the profile of each test at its end
+        self.print_profile = print_profile
+        # Budget of each test_explore episode, if any
+        self.budget = budget
+        # Test name -> profile report of its last run
+        self.profiles = {}
 
     # Reset before next correctness test
     def reset(self):
         self.simulator.reset_absolute_world()
         self.simulator.relative_reborn()  # reborn is called here
         self.simulator.reset_relative_world(self.simulator.abs_world.start_indicators)  # reposition(L) is called here
+        self.simulator.reset_stats()
 
     # Simulate action in absolute world to generate percepts 
     # which are then passed as L in move(A,L) calls to Agent
     def execute_action(self, action):
         print(action)
-        if action == 'moveforward':
-            indicators = self.simulator.move_forward()
-            # If indicators is None means reposition(L) was called inside move_forward()
-            # due to Wumpus/Confundus Portal so no need to call move(A,L)
-            if indicators:
-                list(prolog.query(f'move(moveforward,{indicators})'))
-        if action == 'turnleft':
-            indicators = self.simulator.turn_left()
-            list(prolog.query(f'move(turnleft,{indicators})'))
-        if action == 'turnright':
-            indicators = self.simulator.turn_right()
-            list(prolog.query(f'move(turnright,{indicators})'))
-        if action == 'pickup':
-            indicators = self.simulator.pickup_coin()
-            list(prolog.query(f'move(pickup,{indicators})'))
-        if action == 'shoot':
-            indicators = self.simulator.shoot_arrow()
-            list(prolog.query(f'move(shoot,{indicators})'))
+        with self.simulator.agent.profiler.phase('simulate'):
+            if action == 'moveforward':
+                indicators = self.simulator.move_forward()
+            elif action == 'turnleft':
+                indicators = self.simulator.turn_left()
+            elif action == 'turnright':
+                indicators = self.simulator.turn_right()
+            elif action == 'pickup':
+                indicators = self.simulator.pickup_coin()
+            elif action == 'shoot':
+                indicators = self.simulator.shoot_arrow()
+            else:
+                raise ValueError(f'Unknown action {action!r}, expected one of moveforward, turnleft, turnright, '
+                    'pickup, shoot')
+        self.simulator.steps += 1
+        # If indicators is None means reposition(L) was called inside move_forward()
+        # due to Wumpus/Confundus Portal so no need to call move(A,L)
+        if indicators:
+            self.simulator.agent.move(action, indicators)
+
+    # Update relative map after querying Agent
+    def update_map(self):
+        with self.simulator.agent.profiler.phase('update map'):
+            self.simulator.update_relative_map()
+
+    # Draw map of an AbsoluteWorld or RelativeWorld
+    def render(self, world):
+        with self.simulator.agent.profiler.phase('render'):
+            self.renderer.frame(world)
     
     # Test if Agent can correctly represent its relative position on relative map
+    @profiled_test
+    @rendered_test
     def test_localisation_and_mapping(self):
         self.reset()
         print('[Test correctness of Agent\'s localisation and mapping abilities]')
         print('=== ABSOLUTE WORLD ===')
-        self.simulator.abs_world.print_map()
+        self.render(self.simulator.abs_world)
 
         action_sequence = ['moveforward', 'turnleft', 'turnleft', 'moveforward', 
             'turnright', 'moveforward', 'turnright', 'turnright', 'moveforward']
@@ -922,20 +1399,22 @@ class TestAgent:
 
         print('=== RELATIVE WORLD ===')
         # Initial relative map
-        self.simulator.update_relative_map()
-        self.simulator.rel_world.print_map()
+        self.update_map()
+        self.render(self.simulator.rel_world)
         # Subsequent relative maps
         for action in action_sequence:
             self.execute_action(action)
-            self.simulator.update_relative_map()
-            self.simulator.rel_world.print_map()
+            self.update_map()
+            self.render(self.simulator.rel_world)
 
     # Test if Agent can correctly absorb and interpret sensory input passed by Driver
+    @profiled_test
+    @rendered_test
     def test_sensory_inference(self):
         self.reset()
         print('[Test correctness of Agent\'s sensory inference]')
         print('=== ABSOLUTE WORLD ===')
-        self.simulator.abs_world.print_map()
+        self.render(self.simulator.abs_world)
 
         action_sequence = ['moveforward', 'turnleft', 'moveforward', 'moveforward', 'pickup', 
             'moveforward', 'turnleft', 'moveforward', 'moveforward', 'turnleft', 'shoot']
@@ -943,106 +1422,140 @@ class TestAgent:
 
         print('=== RELATIVE WORLD ===')
         # Initial relative map
-        self.simulator.update_relative_map()
-        self.simulator.rel_world.print_map()
+        self.update_map()
+        self.render(self.simulator.rel_world)
         # Subsequent relative maps
         for action in action_sequence:
             self.execute_action(action)
-            self.simulator.update_relative_map()
-            self.simulator.rel_world.print_map()
+            self.update_map()
+            self.render(self.simulator.rel_world)
 
     # Test if Agent can reset its knowledge base after stepping through Confundus Portal
+    @profiled_test
+    @rendered_test
     def test_confundus_portal(self):
         self.reset()
         print('[Test correctness of Agent\'s memory management after stepping through a Confundus Portal]')
         print('=== ABSOLUTE WORLD ===')
-        self.simulator.abs_world.print_map()
+        self.render(self.simulator.abs_world)
 
         action_sequence = ['moveforward', 'moveforward']
         print(', '.join([str(action) for action in action_sequence]))
 
         print('=== RELATIVE WORLD ===')
         # Initial relative map
-        self.simulator.update_relative_map()
-        self.simulator.rel_world.print_map()
+        self.update_map()
+        self.render(self.simulator.rel_world)
         # Subsequent relative maps
         for action in action_sequence:
             self.execute_action(action)
-            self.simulator.update_relative_map()
-            self.simulator.rel_world.print_map()
+            self.update_map()
+            self.render(self.simulator.rel_world)
 
         # Print absolute map again after teleport for verification
         print('=== ABSOLUTE WORLD (after teleport) ===')
-        self.simulator.abs_world.print_map()
+        self.render(self.simulator.abs_world)
 
     # Test if Agent can reset its knowledge base for a new game after walking into Wumpus
+    @profiled_test
+    @rendered_test
     def test_end_game_reset(self):
         self.reset()
         print('[Test correctness of Agent\'s end-game reset]')
         print('=== ABSOLUTE WORLD ===')
-        self.simulator.abs_world.print_map()
+        self.render(self.simulator.abs_world)
 
         action_sequence = ['turnleft', 'moveforward', 'moveforward']
         print(', '.join([str(action) for action in action_sequence]))
 
         print('=== RELATIVE WORLD ===')
         # Initial relative map
-        self.simulator.update_relative_map()
-        self.simulator.rel_world.print_map()
+        self.update_map()
+        self.render(self.simulator.rel_world)
         # Subsequent relative maps
         for action in action_sequence:
             self.execute_action(action)
-            self.simulator.update_relative_map()
-            self.simulator.rel_world.print_map()
+            self.update_map()
+            self.render(self.simulator.rel_world)
 
     # Test correctness of Agent's exploration capabilities
+    # Return the episode statistics of the Simulator, and why the episode was stopped if it was (budget_exceeded
+    # or stuck)
+    @profiled_test
+    @rendered_test
     def test_explore(self):
+        if self.budget:
+            self.budget.start(self.simulator)
+        try:
+            self.explore()
+        except BudgetExceeded as exceeded:
+            # Stopped between queries (or by Prolog aborting one), so the next test can reset Agent as usual
+            print(f'Stopped: {exceeded}')
+            # Keep the maps of the stopped episode for inspection, as for a failed test
+            self.renderer.test_failed()
+            return dict(self.simulator.stats(), budget_exceeded=self.budget.report(exceeded, self.simulator))
+        except AgentStuck as stuck:
+            print(f'Stopped: {stuck}')
+            # Keep the maps of the stopped episode for inspection, as for a failed test
+            self.renderer.test_failed()
+            return dict(self.simulator.stats(), stuck=str(stuck))
+        finally:
+            if self.budget:
+                self.budget.stop(self.simulator)
+        return self.simulator.stats()
+
+    def explore(self):
         self.reset()
         print('[Test correctness of Agent\'s exploration capabilities]')
         print('=== ABSOLUTE WORLD ===')
-        self.simulator.abs_world.print_map()
+        self.render(self.simulator.abs_world)
 
         print('=== RELATIVE WORLD ===')
         # Initial relative map
-        self.simulator.update_relative_map()
-        self.simulator.rel_world.print_map()
+        self.update_map()
+        self.render(self.simulator.rel_world)
 
         # Keep calling explore(L) until all coins are collected
         while self.simulator.coins_collected < self.simulator.abs_world.coins_at_start:
-            result = list(prolog.query('explore(L)'))
-            # print(result)
-            suggested_actions = result[0].get('L')
+            self.check_budget()
+            suggested_actions = self.simulator.agent.explore()
             if suggested_actions:
                 for action in suggested_actions:
-                    self.execute_action(action)
-                    self.simulator.update_relative_map()
-                    self.simulator.rel_world.print_map()
+                    self.explore_action(action)
             else:
                 # If no suggested actions from Agent (i.e., L = [])
                 # Driver will force an action sequence (mainly to not let Agent get stuck when surrounded by unsafe cells)
                 forced_actions = self.simulator.get_next_action_sequence()
                 for action in forced_actions:
-                    self.execute_action(action)
-                    self.simulator.update_relative_map()
-                    self.simulator.rel_world.print_map()
+                    self.explore_action(action)
 
             # Order Agent to pickup if current cell contains a Coin
-            if bool(list(prolog.query(f'glitter({self.simulator.rel_x},{self.simulator.rel_y})'))):
-                self.execute_action('pickup')
-                self.simulator.update_relative_map()
-                self.simulator.rel_world.print_map()
+            if self.simulator.agent.holds('glitter', self.simulator.rel_x, self.simulator.rel_y):
+                self.explore_action('pickup')
         
         # Coin collected, so keep calling explore(L) until Agent returns to Origin
         while (self.simulator.rel_x, self.simulator.rel_y) != (self.simulator.rel_world.origin_x, self.simulator.rel_world.origin_y):
-            result = list(prolog.query('explore(L)'))
-            suggested_actions = result[0].get('L')
+            self.check_budget()
+            suggested_actions = self.simulator.agent.explore()
             if suggested_actions:
                 for action in suggested_actions:
-                    self.execute_action(action)
-                    self.simulator.update_relative_map()
-                    self.simulator.rel_world.print_map()
+                    self.explore_action(action)
+            else:
+                # Agent's state would never change again, so neither would its answer
+                raise AgentStuck('No actions suggested to return to the origin')
+
+    # Execute an action of test_explore within the budget, and draw the relative map after it
+    def explore_action(self, action):
+        self.check_budget()
+        self.execute_action(action)
+        self.update_map()
+        self.render(self.simulator.rel_world)
+
+    def check_budget(self):
+        if self.budget:
+            self.budget.check(self.simulator)
+
 
-            
 # Convert the list of on/offs to a string of indicator names
 # E.g., [on,off,off,off,off,off] to Confounded-S-T-G-B-S
 def onoff_to_name(onoffs):
@@ -1056,8 +1569,23 @@ if __name__ == '__main__':
     # Source is either "Self" or "Friend"
     filename = 'JP-testPrintout-Self-Self.txt'  # Change accordingly
 
-    simulator = Simulator(layout1)
-    agenttest = TestAgent(simulator)
+    parser = argparse.ArgumentParser(description='Run the correctness tests of the Agent.')
+    parser.add_argument('--render', choices=MapRenderer.POLICIES, default='always', help='When to print maps')
+    parser.add_argument('-n', type=int, default=1, help='n for the "every" and "ring" render policies')
+    parser.add_argument('--frames', default='JP-testFrames.jsonl', help='Output file for the "delta" render policy')
+    parser.add_argument('--profile', action='store_true', help='Print a profile of Agent queries and Driver phases after each test')
+    parser.add_argument('--profile-json', help='Write the profile of each test to this JSON file')
+    parser.add_argument('--seed', type=int, help='Seed of the teleports')
+    parser.add_argument('--trace', help='Record the calls to Agent to this trace file (see traces.py to replay it)')
+    args = parser.parse_args()
+    if args.n < 1:
+        parser.error('-n must be at least 1')
+
+    simulator = Simulator(layout1, args.seed)
+    agenttest = TestAgent(simulator, MapRenderer(args.render, args.n, args.frames), args.profile)
+
+    if args.trace:
+        default_agent.trace = TraceRecorder(args.trace)
 
     temp = sys.stdout
     sys.stdout = open(filename, 'w')
@@ -1067,5 +1595,10 @@ if __name__ == '__main__':
     agenttest.test_confundus_portal()
     agenttest.test_end_game_reset()
     agenttest.test_explore()
+    agenttest.renderer.close()
     sys.stdout.close()
     sys.stdout = temp
+    if default_agent.trace:
+        default_agent.trace.close()
+    if args.profile_json:
+        write_json(agenttest.profiles, args.profile_json)
@@ -0,0 +1,111 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+
+from layouts import iter_layouts, load_layout
+
+# Batch simulation runner
+# ====================================================================================================
+# Runs test_explore episodes on many layouts in a pool of worker processes
+# Driver.py creates a Prolog engine at import time (the Agent is consulted on its first query), and pyswip
+# allows one engine per process, so Driver is only imported inside the workers (never in the parent)
+# Episodes may be given step, query and time budgets (see Budget in Driver.py), so that an Agent going in
+# circles only holds its worker until its budget runs out
+# The teleports of the i-th layout are seeded with seed+i, so that a batch is repeatable however its
+# episodes are spread over the workers
+Driver = None
+budget = None  # (steps, queries, seconds) of each episode
+
+
+def init_worker(episode_budget=None):
+    global Driver, budget
+    # Episodes print every action, which nobody reads in a batch run
+    sys.stdout = open(os.devnull, 'w')
+    import Driver
+    budget = episode_budget
+
+
+# Run one test_explore episode on a layout and return its outcome
+def run_episode(item):
+    name, layout, seed = item
+    start_time = time.perf_counter()
+    outcome = {'layout': name, 'seed': seed}
+    try:
+        simulator = Driver.Simulator(layout, seed)
+        agenttest = Driver.TestAgent(simulator, Driver.MapRenderer('never'), budget=budget and Driver.Budget(*budget))
+        outcome.update(agenttest.test_explore())
+        outcome['status'] = next((status for status in ('budget_exceeded', 'stuck') if status in outcome), 'ok')
+        outcome['profile'] = agenttest.profiles['test_explore']
+    except Exception as e:
+        outcome['status'] = 'error'
+        outcome['error'] = f'{type(e).__name__}: {e}'
+    outcome['wall_time'] = time.perf_counter() - start_time
+    return outcome
+
+
+# Run episodes on (name, layout) pairs over a pool of worker processes
+# Return the outcomes in the same order as the layouts
+def run_batch(layouts, workers=None, budget=None, seed=0):
+    items = ((name, layout, seed + i) for i, (name, layout) in enumerate(layouts))
+    # Start workers from scratch so that none inherits a Prolog engine from its parent
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=init_worker, initargs=(budget,)) as pool:
+        return list(pool.imap(run_episode, items))
+
+
+def summarize(outcomes, wall_time):
+    ok = [outcome for outcome in outcomes if outcome['status'] == 'ok']
+    summary = {
+        'episodes': len(outcomes),
+        'errors': sum(outcome['status'] == 'error' for outcome in outcomes),
+        'budget_exceeded': sum(outcome['status'] == 'budget_exceeded' for outcome in outcomes),
+        'stuck': sum(outcome['status'] == 'stuck' for outcome in outcomes),
+        'wall_time': wall_time,
+        'episodes_per_second': len(outcomes) / wall_time if wall_time else None
+    }
+    for key in ('coins_collected', 'steps', 'deaths', 'teleports'):
+        values = [outcome[key] for outcome in ok]
+        summary[key] = {
+            'total': sum(values),
+            'mean': statistics.mean(values) if values else None
+        }
+    summary['all_coins_collected'] = sum(outcome['coins_collected'] == outcome['coins_at_start'] for outcome in ok)
+    times = [outcome['wall_time'] for outcome in outcomes]
+    summary['episode_time'] = {
+        'mean': statistics.mean(times) if times else None,
+        'max': max(times) if times else None
+    }
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run test_explore episodes on many layouts in parallel.')
+    parser.add_argument('layouts', nargs='*', help='Layout files')
+    parser.add_argument('--generate', type=int, default=0, help='No. of random layouts to run as well')
+    parser.add_argument('--size', default='12x8', help='Size WIDTHxHEIGHT of the random layouts')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the random layouts and teleports')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='No. of worker processes')
+    parser.add_argument('--max-steps', type=int, help='Step budget of each episode')
+    parser.add_argument('--max-queries', type=int, help='Agent query budget of each episode')
+    parser.add_argument('--max-seconds', type=float, help='Time budget of each episode')
+    parser.add_argument('--output', help='Write the outcomes and summary to this JSON file')
+    args = parser.parse_args()
+
+    width, height = map(int, args.size.split('x'))
+    items = [(path, load_layout(path)) for path in args.layouts]
+    items = itertools.chain(items, iter_layouts(args.generate, width, height, args.seed))
+    start_time = time.perf_counter()
+    budget = (args.max_steps, args.max_queries, args.max_seconds)
+    outcomes = run_batch(items, args.workers, budget if any(limit is not None for limit in budget) else None,
+        args.seed)
+    summary = summarize(outcomes, time.perf_counter() - start_time)
+
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'summary': summary, 'outcomes': outcomes}, f, indent=2)
@@ -0,0 +1,193 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+from layouts import iter_layouts
+from profiler import Profiler, write_json
+
+# Driver benchmark
+# ====================================================================================================
+# Measures how Driver scales with the size of the world, on seeded random layouts of each size
+# 'script': A fixed random action sequence per layout, each action simulated, told to Agent with move(A,L),
+#           followed by a map update and render, as in the correctness tests
+# 'explore': A full test_explore episode per layout
+# Each case (kind, size, backend) runs in a fresh worker process with its own Prolog engine, so that its
+# peak memory (of the whole process, Prolog included) is its own
+# Backends are the ways AgentClient can ask Agent: 'memoized' answers repeated queries from its cache
+# until Agent's state changes, 'direct' sends every query to Prolog
+# Queries per step count every query from Driver to Agent, answered by Prolog or from the cache
+# Episodes run within a budget (see Budget in Driver.py), and episodes stopped by it or stuck are reported
+KINDS = ('script', 'explore')
+BACKENDS = {'memoized': True, 'direct': False}
+SIZES = ['6x7', '12x8', '24x16', '48x32']
+# Action frequencies of the scripted sequences
+SCRIPT_ACTIONS = ['moveforward', 'turnleft', 'turnright', 'pickup', 'shoot']
+SCRIPT_WEIGHTS = [0.6, 0.15, 0.15, 0.05, 0.05]
+# Metrics compared against a baseline, and whether higher is better
+METRICS = {'steps_per_second': True, 'prolog_time': False, 'python_time': False, 'render_time': False,
+    'peak_rss_mb': False, 'queries_per_step': False}
+
+# Driver is only imported inside the workers (see batch.py)
+Driver = None
+
+
+def init_worker():
+    global Driver
+    # Maps and actions are printed as in the correctness tests, so that rendering is measured too
+    sys.stdout = open(os.devnull, 'w')
+    import Driver
+
+
+# Simulate a fixed action sequence, telling Agent each action like TestAgent.execute_action
+def run_script(agenttest, actions):
+    agenttest.reset()
+    agenttest.update_map()
+    agenttest.render(agenttest.simulator.rel_world)
+    for action in actions:
+        agenttest.execute_action(action)
+        agenttest.update_map()
+        agenttest.render(agenttest.simulator.rel_world)
+    return agenttest.simulator.stats()
+
+
+# Run one case on all its layouts and return its measurements
+def run_case(case):
+    kind, size, backend, layouts, seed, script_steps, render, budget = case
+    agent = Driver.AgentClient(Profiler(), memoize=BACKENDS[backend])
+    rng = random.Random(seed)
+    totals = {'steps': 0, 'wall_time': 0.0, 'prolog_time': 0.0, 'render_time': 0.0, 'prolog_queries': 0,
+        'cached_queries': 0, 'budget_exceeded': 0, 'stuck': 0}
+    episodes = []
+    for name, layout in layouts:
+        simulator = Driver.Simulator(layout, seed, agent=agent)
+        agenttest = Driver.TestAgent(simulator, Driver.MapRenderer(render), budget=Driver.Budget(*budget))
+        if kind == 'script':
+            actions = rng.choices(SCRIPT_ACTIONS, SCRIPT_WEIGHTS, k=script_steps)
+            agent.profiler.reset()
+            stats = run_script(agenttest, actions)
+            profile = agent.profiler.report()
+        else:
+            stats = agenttest.test_explore()
+            profile = agenttest.profiles['test_explore']
+        agenttest.renderer.flush()
+        render_phase = profile['phases'].get('render')
+        totals['steps'] += stats['steps']
+        totals['wall_time'] += profile['wall_time']
+        totals['prolog_time'] += profile['prolog_time']
+        totals['render_time'] += render_phase['total'] if render_phase else 0.0
+        totals['prolog_queries'] += sum(query['calls'] for query in profile['queries'].values())
+        totals['cached_queries'] += profile['cached_queries']
+        status = next((status for status in ('budget_exceeded', 'stuck') if status in stats), 'ok')
+        if status != 'ok':
+            totals[status] += 1
+        episodes.append({'layout': name, **stats, 'status': status, 'wall_time': profile['wall_time']})
+
+    steps = totals['steps']
+    return {
+        'case': f'{kind}-{size}-{backend}',
+        'kind': kind,
+        'size': size,
+        'backend': backend,
+        'layouts': len(layouts),
+        **totals,
+        'python_time': totals['wall_time'] - totals['prolog_time'],
+        'steps_per_second': steps / totals['wall_time'] if totals['wall_time'] else None,
+        'queries_per_step': (totals['prolog_queries'] + totals['cached_queries']) / steps if steps else None,
+        'cached_per_step': totals['cached_queries'] / steps if steps else None,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'episodes': episodes
+    }
+
+
+# Run cases one after another by default, since cases running side by side disturb each other's timings
+def run_benchmark(cases, workers=1):
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers, initializer=init_worker, maxtasksperchild=1) as pool:
+        return pool.map(run_case, cases, chunksize=1)
+
+
+# Compare the results with those of a baseline run, matched by case name
+# Return one row per metric of each common case, flagging regressions beyond tolerance (a fraction)
+def compare(results, baseline, tolerance=0.1):
+    baseline = {result['case']: result for result in baseline}
+    rows = []
+    for result in results:
+        base = baseline.get(result['case'])
+        if base is None:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            new, old = result.get(metric), base.get(metric)
+            if new is None or not old:
+                continue
+            ratio = new / old
+            regressed = ratio < 1 - tolerance if higher_is_better else ratio > 1 + tolerance
+            rows.append({'case': result['case'], 'metric': metric, 'baseline': old, 'value': new, 'ratio': ratio,
+                'regressed': regressed})
+    return rows
+
+
+def format_results(results):
+    lines = [f'{"case":<28}{"steps":>8}{"steps/s":>10}{"prolog s":>10}{"python s":>10}{"render s":>10}'
+        f'{"queries/step":>14}{"peak MB":>9}{"stopped":>9}']
+    for result in results:
+        lines.append(f'{result["case"]:<28}{result["steps"]:>8}{result["steps_per_second"] or 0:>10.1f}'
+            f'{result["prolog_time"]:>10.3f}{result["python_time"]:>10.3f}{result["render_time"]:>10.3f}'
+            f'{result["queries_per_step"] or 0:>14.2f}{result["peak_rss_mb"]:>9.1f}'
+            f'{result["budget_exceeded"] + result["stuck"]:>9}')
+    return '\n'.join(lines) + '\n'
+
+
+def format_comparison(rows):
+    lines = [f'{"case":<28}{"metric":<18}{"baseline":>12}{"value":>12}{"ratio":>8}']
+    for row in rows:
+        flag = '  REGRESSED' if row['regressed'] else ''
+        lines.append(f'{row["case"]:<28}{row["metric"]:<18}{row["baseline"]:>12.4g}{row["value"]:>12.4g}'
+            f'{row["ratio"]:>8.2f}{flag}')
+    return '\n'.join(lines) + '\n'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark Driver across world sizes and Agent backends.')
+    parser.add_argument('--sizes', nargs='+', default=SIZES, help='Sizes WIDTHxHEIGHT of the random layouts')
+    parser.add_argument('--kinds', nargs='+', choices=KINDS, default=list(KINDS))
+    parser.add_argument('--backends', nargs='+', choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument('--layouts', type=int, default=3, help='No. of random layouts of each size')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the layouts, scripts and teleports')
+    parser.add_argument('--script-steps', type=int, default=200, help='No. of actions of each scripted sequence')
+    parser.add_argument('--render', choices=('always', 'never'), default='always',
+        help='Render maps (to nowhere) or not')
+    parser.add_argument('--max-steps', type=int, help='Step budget of each explore episode')
+    parser.add_argument('--max-queries', type=int, help='Agent query budget of each explore episode')
+    parser.add_argument('--max-seconds', type=float, default=60.0, help='Time budget of each explore episode')
+    parser.add_argument('--workers', type=int, default=1, help='No. of cases run side by side')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', help='Compare with the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Relative change counted as a regression')
+    args = parser.parse_args()
+
+    cases = []
+    for size in args.sizes:
+        width, height = map(int, size.split('x'))
+        layouts = list(iter_layouts(args.layouts, width, height, args.seed))
+        for kind in args.kinds:
+            for backend in args.backends:
+                cases.append((kind, size, backend, layouts, args.seed, args.script_steps, args.render,
+                    (args.max_steps, args.max_queries, args.max_seconds)))
+
+    start_time = time.perf_counter()
+    results = run_benchmark(cases, args.workers)
+    sys.stdout.write(format_results(results))
+    print(f'{len(cases)} cases in {time.perf_counter() - start_time:.2f} s')
+    if args.output:
+        write_json({'config': vars(args), 'results': results}, args.output)
+    if args.baseline:
+        with open(args.baseline) as f:
+            rows = compare(results, json.load(f)['results'], args.tolerance)
+        sys.stdout.write(format_comparison(rows))
+        sys.exit(1 if any(row['regressed'] for row in rows) else 0)
@@ -0,0 +1,85 @@
+import argparse
+import json
+
+import numpy as np
+
+# Delta-frame map output
+# ====================================================================================================
+# Maps are written as JSON lines: a keyframe holding the symbols of every cell, followed by deltas
+# holding only the cells that changed since the previous map of the same world
+# {"n": 0, "world": "AbsoluteWorld", "key": [["#########", ...], ...]}
+# {"n": 1, "world": "RelativeWorld", "key": [...]}
+# {"n": 2, "world": "RelativeWorld", "delta": [[row, col, "..T- -..."], ...]}
+# Symbols of a cell are symbols 1-9 of its 3x3 square (see MapCell in Driver.py)
+# A new keyframe is written whenever the size of the map changes
+
+
+class DeltaFrameWriter:
+    def __init__(self, path, cell_symbols):
+        self.file = open(path, 'w')
+        self.cell_symbols = cell_symbols  # Function from a cell word to its symbols
+        self.previous = {}                # World name -> buffer of cell words of its last map
+        self.count = 0
+
+    def write(self, world):
+        name = type(world).__name__
+        cells = world.cells.copy()
+        previous = self.previous.get(name)
+        record = {'n': self.count, 'world': name}
+        if previous is None or previous.shape != cells.shape:
+            record['key'] = [[self.cell_symbols(word) for word in words] for words in cells.tolist()]
+        else:
+            record['delta'] = [[row, col, self.cell_symbols(int(cells[row, col]))]
+                for row, col in np.argwhere(previous != cells).tolist()]
+        self.file.write(json.dumps(record, separators=(',', ':')) + '\n')
+        self.previous[name] = cells
+        self.count += 1
+
+    def close(self):
+        self.file.close()
+
+
+# Rebuild the full maps from a delta-frame file
+# Yield the world name and symbols (list of rows of cell symbols) of each map in order
+# Every map is its own list of rows, and rows changed by a delta are copied first, so earlier maps keep
+# their symbols (rows a delta did not change are shared between maps, so do not modify yielded maps)
+def decode(path):
+    maps = {}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            name = record['world']
+            if 'key' in record:
+                maps[name] = [list(row) for row in record['key']]
+            else:
+                symbols_map = maps[name] = list(maps[name])
+                copied = set()
+                for row, col, symbols in record['delta']:
+                    if row not in copied:
+                        symbols_map[row] = list(symbols_map[row])
+                        copied.add(row)
+                    symbols_map[row][col] = symbols
+            yield name, maps[name]
+
+
+# Render the symbols of a map as printed by Driver.py
+def render(symbols):
+    lines = []
+    for row in symbols:
+        for k in (0, 3, 6):
+            lines.append(''.join([f'{" ".join(cell[k:k+3])}  ' for cell in row]))
+        lines.append('')
+    lines.append('')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Print the maps of a delta-frame file.')
+    parser.add_argument('path')
+    parser.add_argument('--frame', type=int, help='Only print the map with this index')
+    args = parser.parse_args()
+
+    for n, (name, symbols) in enumerate(decode(args.path)):
+        if args.frame is None or n == args.frame:
+            print(f'[{n}] {name}')
+            print(render(symbols), end='')
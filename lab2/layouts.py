@@ -0,0 +1,114 @@
+import random
+
+
+# Map layout files
+# ====================================================================================================
+# A layout file has one row of the map per line, using the same symbols as the layouts in Driver.py
+# '#': Wall
+# 'W': Wumpus
+# 'O': Confundus Portal
+# '*': Coin
+# '^', '>', 'v', '<': Agent facing North, East, South, West directions
+# ' ': Empty (safe)
+
+
+def load_layout(path):
+    with open(path) as f:
+        rows = [line.rstrip('\n') for line in f if line.strip('\n')]
+    width = max(len(row) for row in rows)
+    # Trailing spaces may have been stripped by an editor
+    return [list(row.ljust(width)) for row in rows]
+
+
+def save_layout(layout, path):
+    with open(path, 'w') as f:
+        f.write(format_layout(layout))
+
+
+def format_layout(layout):
+    return ''.join(''.join(row) + '\n' for row in layout)
+
+
+# Random layout generation
+# ====================================================================================================
+# Generate a random layout of width x height cells (including the outer walls)
+# The generated layout always satisfies the assumptions of Driver.py
+# - The map is enclosed by walls
+# - There is exactly one Agent, which starts in an empty cell (not on a Coin, Wumpus or Confundus Portal)
+# - Every Coin can be reached from the start without passing a wall, Wumpus or Confundus Portal
+# wumpus is the no. of Wumpus; the densities are fractions of the interior cells, and the layout has exactly
+# that many walls, Wumpus and Confundus Portals (walls are laid down first as short straight segments)
+# At least min_coins Coins are placed, or more if coin_density asks for more and enough empty cells can
+# be reached; layouts in which fewer than min_coins can be reached are drawn again (up to MAX_ATTEMPTS times)
+MAX_ATTEMPTS = 100
+
+
+def generate_layout(width, height, seed=None, wumpus=1, portal_density=0.03, coin_density=0.02,
+        wall_density=0.1, min_coins=1):
+    if width < 3 or height < 3:
+        raise ValueError('A layout needs at least 3x3 cells')
+    rng = random.Random(seed)
+    interior = [(i, j) for i in range(1, height-1) for j in range(1, width-1)]
+    walls = int(wall_density * len(interior))
+    portals = int(portal_density * len(interior))
+    coins = max(min_coins, int(coin_density * len(interior)))
+    # Agent's start cell and min_coins Coins need empty cells too
+    if walls + wumpus + portals + 1 + min_coins > len(interior):
+        raise ValueError(f'{walls} walls, {wumpus} Wumpus, {portals} Confundus Portals, Agent and {min_coins} '
+            f'Coins do not fit in {len(interior)} interior cells')
+
+    for _ in range(MAX_ATTEMPTS):
+        layout = [['#'] * width] + [['#'] + [' '] * (width-2) + ['#'] for _ in range(height-2)] + [['#'] * width]
+
+        # Start cell and direction of Agent
+        start = rng.choice(interior)
+        layout[start[0]][start[1]] = rng.choice('^>v<')
+
+        # Wall segments, until the requested no. of walls is placed (there are always empty cells left)
+        remaining = walls
+        while remaining > 0:
+            i, j = rng.choice(interior)
+            di, dj = rng.choice([(0, 1), (1, 0)])
+            for _ in range(min(remaining, rng.randint(1, 4))):
+                if 0 < i < height-1 and 0 < j < width-1 and layout[i][j] == ' ':
+                    layout[i][j] = '#'
+                    remaining -= 1
+                i, j = i+di, j+dj
+
+        # Wumpus and Confundus Portals in empty cells
+        empty = [(i, j) for i, j in interior if layout[i][j] == ' ']
+        rng.shuffle(empty)
+        for k, (i, j) in enumerate(empty[:wumpus+portals]):
+            layout[i][j] = 'W' if k < wumpus else 'O'
+
+        # Coins in empty cells reachable from the start
+        reachable = reachable_cells(layout, start)
+        candidates = sorted((i, j) for i, j in reachable if layout[i][j] == ' ')
+        if len(candidates) >= min_coins:
+            for i, j in rng.sample(candidates, min(coins, len(candidates))):
+                layout[i][j] = '*'
+            return layout
+    raise ValueError(f'No layout with {min_coins} reachable Coins found in {MAX_ATTEMPTS} attempts')
+
+
+# Cells reachable from start without passing a wall, Wumpus or Confundus Portal
+def reachable_cells(layout, start):
+    seen = {start}
+    frontier = [start]
+    while frontier:
+        i, j = frontier.pop()
+        for n in ((i-1, j), (i+1, j), (i, j-1), (i, j+1)):
+            if n not in seen and layout[n[0]][n[1]] not in '#WO':
+                seen.add(n)
+                frontier.append(n)
+    return seen
+
+
+# Lazily generate count layouts (or endlessly if count is None) as (name, layout) pairs
+# Each layout has its own seed derived from seed, so any one of them can be regenerated alone
+def iter_layouts(count, width, height, seed=0, **kwargs):
+    k = 0
+    while count is None or k < count:
+        name = f'random-{width}x{height}-{seed}-{k}'
+        yield name, generate_layout(width, height, seed=name, **kwargs)
+        k += 1
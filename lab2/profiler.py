@@ -0,0 +1,131 @@
+import json
+import time
+
+# Driver/Agent profiler
+# ====================================================================================================
+# Records every query from Driver to Agent per predicate (no. of calls, no. of solutions, total time and
+# a latency histogram) and the time spent in each phase on the Python side of Driver
+# Latency histogram buckets are powers of two in microseconds: bucket k counts calls that took
+# [2^(k-1), 2^k) microseconds (bucket 0 counts calls under 1 microsecond)
+# Queries answered by AgentClient from its cache instead of Agent are counted as cached, with no latency
+# Phase times are inclusive, e.g., the 'update map' phase includes its snapshot query to Agent
+
+
+class QueryStats:
+    __slots__ = ('calls', 'cached', 'solutions', 'total', 'max', 'histogram')
+
+    def __init__(self):
+        self.calls = 0
+        self.cached = 0
+        self.solutions = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.histogram = {}
+
+    def record(self, seconds, solutions):
+        self.calls += 1
+        self.solutions += solutions
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = int(seconds * 1e6).bit_length()
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    # Upper bound (in seconds) of the bucket holding the q-th quantile of the latencies
+    def quantile(self, q):
+        target = q * self.calls
+        count = 0
+        for bucket in sorted(self.histogram):
+            count += self.histogram[bucket]
+            if count >= target:
+                return (1 << bucket) / 1e6
+        return self.max
+
+    def report(self):
+        return {
+            'calls': self.calls,
+            'cached': self.cached,
+            'solutions': self.solutions,
+            'total': self.total,
+            'mean': self.total / self.calls if self.calls else None,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'max': self.max,
+            'histogram_us': {f'<{1 << bucket}': count for bucket, count in sorted(self.histogram.items())}
+        }
+
+
+# Reusable context manager timing one phase
+class Phase:
+    __slots__ = ('calls', 'total', 'start')
+
+    def __init__(self):
+        self.calls = 0
+        self.total = 0.0
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.total += time.perf_counter() - self.start
+        self.calls += 1
+
+
+class Profiler:
+    def __init__(self):
+        self.queries = {}  # Predicate -> QueryStats
+        self.phases = {}   # Phase name -> Phase
+        self.start_time = time.perf_counter()
+
+    def reset(self):
+        self.queries.clear()
+        self.phases.clear()
+        self.start_time = time.perf_counter()
+
+    def query_stats(self, predicate):
+        stats = self.queries.get(predicate)
+        if stats is None:
+            stats = self.queries[predicate] = QueryStats()
+        return stats
+
+    def record_query(self, predicate, seconds, solutions):
+        self.query_stats(predicate).record(seconds, solutions)
+
+    def record_cached(self, predicate):
+        self.query_stats(predicate).cached += 1
+
+    # Time a phase with: with profiler.phase('render'): ...
+    # Phases with the same name must not be nested
+    def phase(self, name):
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase()
+        return phase
+
+    def report(self):
+        return {
+            'wall_time': time.perf_counter() - self.start_time,
+            'prolog_time': sum(stats.total for stats in self.queries.values()),
+            'cached_queries': sum(stats.cached for stats in self.queries.values()),
+            'queries': {predicate: stats.report() for predicate, stats in sorted(self.queries.items())},
+            'phases': {name: {'calls': phase.calls, 'total': phase.total} for name, phase in self.phases.items()}
+        }
+
+    def format_report(self, title='Profile'):
+        report = self.report()
+        lines = [f'=== {title}: {report["wall_time"]*1e3:.1f} ms wall, {report["prolog_time"]*1e3:.1f} ms in Prolog, '
+            f'{report["cached_queries"]} queries cached ===']
+        lines.append(f'{"predicate":<12}{"calls":>8}{"cached":>8}{"solutions":>10}{"total ms":>10}{"mean us":>10}{"p99 us":>10}{"max us":>10}')
+        for predicate, stats in report['queries'].items():
+            lines.append(f'{predicate:<12}{stats["calls"]:>8}{stats["cached"]:>8}{stats["solutions"]:>10}{stats["total"]*1e3:>10.2f}'
+                f'{(stats["mean"] or 0)*1e6:>10.1f}{stats["p99"]*1e6:>10.0f}{stats["max"]*1e6:>10.1f}')
+        lines.append(f'{"phase":<12}{"calls":>8}{"":>18}{"total ms":>10}')
+        for name, phase in report['phases'].items():
+            lines.append(f'{name:<12}{phase["calls"]:>8}{"":>18}{phase["total"]*1e3:>10.2f}')
+        return '\n'.join(lines) + '\n'
+
+
+def write_json(reports, path):
+    with open(path, 'w') as f:
+        json.dump(reports, f, indent=2)
@@ -0,0 +1,81 @@
+import argparse
+import io
+import multiprocessing
+import random
+import sys
+import time
+import traceback
+
+from layouts import load_layout
+
+# Parallel correctness test runner
+# ====================================================================================================
+# Runs each TestAgent correctness test in its own worker process, with its own Prolog engine and
+# Simulator, and writes the printouts of the tests in the canonical order
+# Every test starts with reborn and reposition(L) and rewinds the Simulator's random number generator,
+# so with the same seed the printout is byte-identical to running the tests one after another
+# Only render policies whose output of a test does not depend on the tests before it are supported
+TESTS = ['test_localisation_and_mapping', 'test_sensory_inference', 'test_confundus_portal',
+    'test_end_game_reset', 'test_explore']
+POLICIES = ('always', 'never', 'failure')
+
+# Driver is only imported inside the workers (see batch.py)
+Driver = None
+
+
+def init_worker():
+    global Driver
+    import Driver
+
+
+# Run one test and return its printout, and the traceback if it failed
+def run_test(job):
+    name, layout, seed, policy = job
+    output = io.StringIO()
+    stdout, sys.stdout = sys.stdout, output
+    error = None
+    try:
+        simulator = Driver.Simulator(layout or Driver.layout1, seed)
+        agenttest = Driver.TestAgent(simulator, Driver.MapRenderer(policy))
+        getattr(agenttest, name)()
+        agenttest.renderer.flush()
+    except Exception:
+        error = traceback.format_exc()
+    finally:
+        sys.stdout = stdout
+    return output.getvalue(), error
+
+
+# Run tests in parallel and return their (printout, traceback) in the order of tests
+def run_tests(tests=TESTS, layout=None, seed=None, policy='always', workers=None):
+    if policy not in POLICIES:
+        raise ValueError(f'Render policy {policy!r} cannot run in parallel, expected one of {POLICIES}')
+    # All tests must see the same teleports, as they would on one Simulator
+    if seed is None:
+        seed = random.randrange(2**32)
+    jobs = [(name, layout, seed, policy) for name in tests]
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(workers or len(jobs), initializer=init_worker) as pool:
+        return pool.map(run_test, jobs, chunksize=1)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the correctness tests of the Agent in parallel.')
+    parser.add_argument('--output', default='JP-testPrintout-Self-Self.txt', help='Printout file')
+    parser.add_argument('--layout', help='Layout file (default: layout1 of Driver.py)')
+    parser.add_argument('--seed', type=int, help='Seed of the teleports')
+    parser.add_argument('--render', choices=POLICIES, default='always', help='When to print maps')
+    parser.add_argument('--workers', type=int, help='No. of worker processes (default: one per test)')
+    args = parser.parse_args()
+
+    layout = load_layout(args.layout) if args.layout else None
+    start_time = time.perf_counter()
+    results = run_tests(TESTS, layout, args.seed, args.render, args.workers)
+    # Like a serial run, the printout stops at the first failed test
+    with open(args.output, 'w') as f:
+        for name, (output, error) in zip(TESTS, results):
+            f.write(output)
+            if error:
+                sys.stderr.write(f'{name} failed\n{error}')
+                sys.exit(1)
+    print(f'{len(TESTS)} tests in {time.perf_counter() - start_time:.2f} s')
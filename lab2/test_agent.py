@@ -0,0 +1,160 @@
+import time
+
+import numpy as np
+import pytest
+
+from layouts import iter_layouts
+from profiler import Profiler
+from vecenv import ACTIONS, DIRECTIONS, VecWorlds
+
+# Driver/Agent tests on a real Prolog engine
+# ====================================================================================================
+# Each test loads a small stub Agent (not JP-Agent.pl) into its own Prolog module, since all tests share
+# the one engine of the process
+try:
+    import Driver
+except Exception:  # pyswip raises its own error if SWI-Prolog cannot be found
+    pytest.skip('SWI-Prolog is not installed', allow_module_level=True)
+
+# Agent that only keeps track of its position and the cells it visited
+STUB_AGENT = """
+:- dynamic current/3, visited/2, safe/2, wumpus/2, confundus/2, stench/2, tingle/2, glitter/2, wall/2.
+hasarrow.
+reborn :-
+    retractall(current(_, _, _)), retractall(visited(_, _)),
+    assertz(current(0, 0, rnorth)), assertz(visited(0, 0)).
+reposition(_) :- reborn.
+move(moveforward, _) :- !,
+    retract(current(X, Y, D)), Y1 is Y + 1,
+    assertz(current(X, Y1, D)), assertz(visited(X, Y1)).
+move(_, _).
+explore([]).
+"""
+
+
+@pytest.fixture
+def agent_path(tmp_path):
+    path = tmp_path / 'stub-agent.pl'
+    path.write_text(STUB_AGENT)
+    return path.as_posix()
+
+
+def test_module_agents_do_not_share_knowledge(agent_path):
+    agent_a = Driver.AgentClient(Profiler(), module='isolation_a', path=agent_path, memoize=False)
+    agent_b = Driver.AgentClient(Profiler(), module='isolation_b', path=agent_path, memoize=False)
+    agent_a.reborn()
+    agent_b.reborn()
+    agent_a.move('moveforward', ['off'] * 6)
+    assert agent_a.current() == (0, 1, 'rnorth')
+    assert agent_a.holds('visited', 0, 1)
+    assert agent_b.current() == (0, 0, 'rnorth')
+    assert not agent_b.holds('visited', 0, 1)
+    # Reborn in one module leaves the other as it was
+    agent_b.reborn()
+    assert agent_a.holds('visited', 0, 1)
+
+
+def test_explore_stops_when_agent_is_stuck(agent_path):
+    agent = Driver.AgentClient(Profiler(), module='stuck', path=agent_path)
+    # Coin out of reach, and the stub Agent never suggests any actions
+    layout = [list('#####'), list('#>#*#'), list('#####')]
+    agenttest = Driver.TestAgent(Driver.Simulator(layout, 0, agent=agent), Driver.MapRenderer('never'))
+    result = agenttest.test_explore()
+    assert result['stuck']
+    assert result['coins_collected'] == 0
+
+
+def test_explore_stops_at_time_budget(tmp_path):
+    # explore(L) never returns, so only Prolog aborting the query can end the episode
+    path = tmp_path / 'hanging-agent.pl'
+    path.write_text(STUB_AGENT.replace('explore([]).', 'explore(_) :- repeat, fail.'))
+    agent = Driver.AgentClient(Profiler(), module='hanging', path=path.as_posix())
+    agenttest = Driver.TestAgent(Driver.Simulator(Driver.layout1, 0, agent=agent), Driver.MapRenderer('never'),
+        budget=Driver.Budget(seconds=0.5))
+    start_time = time.perf_counter()
+    result = agenttest.test_explore()
+    assert time.perf_counter() - start_time < 5
+    assert result['budget_exceeded']['budget'] == 'seconds'
+    assert agent.deadline is None
+    # The engine is left ready for the next episode
+    agent.reborn()
+    assert agent.current() == (0, 0, 'rnorth')
+
+
+def test_agent_loads_from_a_path_with_quotes(tmp_path):
+    path = tmp_path / "it's an agent.pl"
+    path.write_text(STUB_AGENT)
+    agent = Driver.AgentClient(Profiler(), module="quoted'agent", path=path.as_posix())
+    agent.reborn()
+    assert agent.current() == (0, 0, 'rnorth')
+
+
+def test_failed_load_is_retried(tmp_path):
+    path = tmp_path / 'late-agent.pl'
+    agent = Driver.AgentClient(Profiler(), module='late', path=path.as_posix())
+    with pytest.raises(Driver.PrologError):
+        agent.reborn()
+    assert not agent.loaded
+    path.write_text(STUB_AGENT)
+    agent.reborn()
+    assert agent.current() == (0, 0, 'rnorth')
+
+
+def test_explore_is_led_to_coins_agent_does_not_pick_up(agent_path):
+    agent = Driver.AgentClient(Profiler(), module='coin', path=agent_path)
+    # The stub Agent never perceives Glitter, so the Coin is only collected if Driver leads Agent to it
+    layout = [list('######'), list('#>* ##'), list('######')]
+    agenttest = Driver.TestAgent(Driver.Simulator(layout, 0, agent=agent), Driver.MapRenderer('never'))
+    result = agenttest.test_explore()
+    assert result['coins_collected'] == 1
+
+
+def test_unknown_actions_are_rejected(agent_path):
+    agent = Driver.AgentClient(Profiler(), module='unknown_action', path=agent_path)
+    agenttest = Driver.TestAgent(Driver.Simulator(Driver.layout1, 0, agent=agent), Driver.MapRenderer('never'))
+    agenttest.reset()
+    with pytest.raises(ValueError, match='climb'):
+        agenttest.execute_action('climb')
+    assert agenttest.simulator.steps == 0
+
+
+def test_vecworlds_step_like_simulator(agent_path):
+    agent = Driver.AgentClient(Profiler(), module='vecenv', path=agent_path)
+    layouts = [layout for _, layout in iter_layouts(8, 8, 6, portal_density=0.1)]
+    simulators = [Driver.Simulator(layout, k, agent=agent) for k, layout in enumerate(layouts)]
+    worlds = VecWorlds(layouts, 0)
+    rng = np.random.default_rng(0)
+    totals = {'moved': 0, 'bumped': 0, 'teleported': 0, 'died': 0, 'coin': 0}
+    for actions in rng.choice(len(ACTIONS), size=(1000, len(layouts)), p=[0.6, 0.15, 0.15, 0.05, 0.05]):
+        worlds.step(actions)
+        for k, simulator in enumerate(simulators):
+            result = simulator.step(ACTIONS[actions[k]])
+            for flag in totals:
+                assert getattr(worlds, flag)[k] == getattr(result, flag)
+                totals[flag] += getattr(result, flag)
+            if result.teleported:
+                # Teleports are drawn differently, so the world follows the Simulator to its destination
+                worlds.row[k], worlds.col[k] = simulator.abs_world.xy_to_rowcol(simulator.abs_x, simulator.abs_y)
+                worlds.direction[k] = DIRECTIONS.index(simulator.abs_direction)
+        percepts = worlds.sense(worlds.teleported | worlds.died)
+        for k, simulator in enumerate(simulators):
+            assert percepts[k] == simulator.result.percepts
+            assert (worlds.row[k], worlds.col[k]) == simulator.abs_world.xy_to_rowcol(simulator.abs_x, simulator.abs_y)
+            assert DIRECTIONS[worlds.direction[k]] == simulator.abs_direction
+            assert worlds.coins_collected[k] == simulator.coins_collected
+    # Every kind of outcome was compared
+    assert all(totals.values())
+
+
+def test_query_ending_after_the_deadline_exceeds_the_budget(tmp_path):
+    # explore(L) ends, but only after the deadline, whether or not Prolog aborts it at the deadline
+    path = tmp_path / 'slow-agent.pl'
+    path.write_text(STUB_AGENT.replace('explore([]).', 'explore([]) :- sleep(1).'))
+    agent = Driver.AgentClient(Profiler(), module='slow', path=path.as_posix())
+    agent.reborn()
+    agent.deadline = time.perf_counter() + 0.5
+    with pytest.raises(Driver.BudgetExceeded):
+        agent.explore()
+    # Without a deadline the query runs to its end again
+    agent.deadline = None
+    agent.explore()
@@ -0,0 +1,43 @@
+import numpy as np
+
+from frames import DeltaFrameWriter, decode
+
+
+# Stand-ins for the worlds of Driver.py, since frames are told apart by the class name of the world
+class AbsoluteWorld:
+    def __init__(self, cells):
+        self.cells = cells
+
+
+class RelativeWorld(AbsoluteWorld):
+    pass
+
+
+def cell_symbols(word):
+    return f'{word:09d}'
+
+
+def test_decode_returns_the_maps_written(tmp_path):
+    rng = np.random.default_rng(0)
+    path = tmp_path / 'frames.jsonl'
+    writer = DeltaFrameWriter(path, cell_symbols)
+    worlds = [AbsoluteWorld(rng.integers(0, 50, size=(4, 5))), RelativeWorld(rng.integers(0, 50, size=(3, 3)))]
+    expected = []
+    for n in range(200):
+        world = worlds[rng.integers(2)]
+        if n % 40 == 39:
+            # Growing the map writes a new keyframe
+            height, width = world.cells.shape
+            world.cells = rng.integers(0, 50, size=(height+2, width+2))
+        else:
+            # Change a few cells in place, or none at all
+            for _ in range(rng.integers(4)):
+                row, col = rng.integers(world.cells.shape[0]), rng.integers(world.cells.shape[1])
+                world.cells[row, col] = rng.integers(50)
+        writer.write(world)
+        expected.append((type(world).__name__, [[cell_symbols(word) for word in words] for words in world.cells.tolist()]))
+    writer.close()
+
+    # Every map decoded is kept until the end, so a later delta changing an earlier map would show
+    decoded = list(decode(path))
+    assert decoded == expected
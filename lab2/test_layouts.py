@@ -0,0 +1,45 @@
+import pytest
+
+from layouts import format_layout, generate_layout, iter_layouts, reachable_cells
+
+
+def count(layout, symbols):
+    return sum(symbol in symbols for row in layout for symbol in row)
+
+
+@pytest.mark.parametrize('width, height, kwargs', [
+    (6, 7, {}),
+    (12, 8, {}),
+    (48, 32, {}),
+    (20, 20, {'wumpus': 3, 'portal_density': 0.05, 'wall_density': 0.3, 'min_coins': 5}),
+])
+def test_layouts_have_the_requested_counts(width, height, kwargs):
+    interior = (width-2) * (height-2)
+    options = {'wumpus': 1, 'portal_density': 0.03, 'coin_density': 0.02, 'wall_density': 0.1, 'min_coins': 1,
+        **kwargs}
+    for _, layout in iter_layouts(20, width, height, **kwargs):
+        assert len(layout) == height and all(len(row) == width for row in layout)
+        assert count(layout, '#') == 2*width + 2*(height-2) + int(options['wall_density'] * interior)
+        assert count(layout, 'W') == options['wumpus']
+        assert count(layout, 'O') == int(options['portal_density'] * interior)
+        assert count(layout, '^>v<') == 1
+        coins = count(layout, '*')
+        assert options['min_coins'] <= coins <= max(options['min_coins'], int(options['coin_density'] * interior))
+        # Every Coin can be reached from the start
+        start = next((i, j) for i, row in enumerate(layout) for j, symbol in enumerate(row) if symbol in '^>v<')
+        coin_cells = {(i, j) for i, row in enumerate(layout) for j, symbol in enumerate(row) if symbol == '*'}
+        assert coin_cells <= reachable_cells(layout, start)
+
+
+def test_layouts_are_repeatable():
+    assert format_layout(generate_layout(24, 16, seed='a')) == format_layout(generate_layout(24, 16, seed='a'))
+
+
+def test_impossible_layouts_are_rejected():
+    with pytest.raises(ValueError):
+        generate_layout(3, 3)
+    with pytest.raises(ValueError):
+        generate_layout(6, 6, wall_density=0.9)
+    # Walls leave room for 20 Coins, but never 20 reachable from the start
+    with pytest.raises(ValueError):
+        generate_layout(12, 8, seed=0, wall_density=0.6, min_coins=20)
@@ -0,0 +1,54 @@
+import numpy as np
+
+from vecenv import BUMP, CONFOUNDED, GLITTER, MOVEFORWARD, PICKUP, SCREAM, SHOOT, TINGLE, TURNLEFT, VecWorlds
+
+LAYOUT = [
+    list('#######'),
+    list('#>*  W#'),
+    list('# O   #'),
+    list('#######'),
+]
+
+
+def test_step_outcomes():
+    # Every world is the same layout, each given its own action
+    worlds = VecWorlds([LAYOUT] * 4, seed=0)
+    assert (worlds.percepts == CONFOUNDED).all()
+
+    percepts = worlds.step([MOVEFORWARD, TURNLEFT, SHOOT, PICKUP])
+    assert worlds.moved.tolist() == [True, False, False, False]
+    assert percepts[0] == GLITTER | TINGLE
+    # Turning left faces the wall above, so the next move bumps
+    assert worlds.step([PICKUP, MOVEFORWARD, MOVEFORWARD, MOVEFORWARD])[1] == BUMP
+    assert worlds.coins_collected.tolist() == [1, 0, 0, 0]
+    # The arrow of world 2 killed Wumpus, and its stench went with it
+    assert not worlds.wumpus[2].any() and not worlds.stench[2].any()
+
+    # World 0 walks east into Wumpus' cell and the game is reset, world 2 walks past it (shot dead)
+    for _ in range(3):
+        percepts = worlds.step([MOVEFORWARD, TURNLEFT, MOVEFORWARD, TURNLEFT])
+    assert worlds.died.tolist() == [True, False, False, False] and worlds.deaths[0] == 1
+    assert percepts[0] == CONFOUNDED
+    assert (worlds.row[0], worlds.col[0]) == (1, 1) and worlds.coins_collected[0] == 0 and worlds.wumpus[0].any()
+    assert (worlds.row[2], worlds.col[2]) == (1, 5)
+
+
+def test_shot_screams():
+    worlds = VecWorlds([LAYOUT], seed=0)
+    percepts = worlds.step([SHOOT])
+    assert percepts[0] == SCREAM and not worlds.has_arrow[0]
+    # Only one arrow
+    assert worlds.step([SHOOT])[0] == 0
+
+
+def test_teleports_land_on_safe_cells():
+    layout = [list('#####'), list('#>O #'), list('#  W#'), list('#####')]
+    worlds = VecWorlds([layout] * 200, seed=0)
+    percepts = worlds.step(np.full(200, MOVEFORWARD))
+    assert worlds.teleported.all()
+    assert (percepts & CONFOUNDED).all()
+    k = np.arange(200)
+    cells = worlds.wall | worlds.wumpus | worlds.portal
+    assert not cells[k, worlds.row, worlds.col].any()
+    # All four safe cells are drawn
+    assert len(set(zip(worlds.row.tolist(), worlds.col.tolist()))) == 4
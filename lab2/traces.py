@@ -0,0 +1,70 @@
+import argparse
+import json
+import sys
+
+# Agent traces
+# ====================================================================================================
+# A trace records, as one JSON array per line, every call from Driver that changes Agent's state, every
+# explore(L) answer and every random draw of the simulator, in the order they happened
+# ["test", "test_explore"]                                   Start of a correctness test
+# ["reborn"]
+# ["reposition", ["on", "off", "off", "off", "off", "off"]]
+# ["move", "moveforward", ["off", "on", "off", "off", "off", "off"]]
+# ["explore", ["turnleft", "moveforward"]]                   Actions suggested by Agent
+# ["teleport", 3, 1, "east"]                                 Absolute x, y and direction drawn for a teleport
+# Replaying a trace feeds the recorded percepts straight to Agent without simulating the absolute world,
+# and reports every explore(L) whose answer differs from the recorded one
+
+
+class TraceRecorder:
+    def __init__(self, path):
+        self.file = open(path, 'w')
+
+    def record(self, op, *args):
+        self.file.write(json.dumps([op, *args], separators=(',', ':')) + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+def read_trace(path):
+    with open(path) as f:
+        for line in f:
+            yield json.loads(line)
+
+
+# Replay a trace against Agent through agent (an AgentClient of Driver.py)
+# Return a summary with the explore(L) answers that differ from the trace
+def replay(path, agent):
+    summary = {'records': 0, 'calls': 0, 'explores': 0, 'mismatches': []}
+    test = None
+    for n, (op, *args) in enumerate(read_trace(path)):
+        summary['records'] += 1
+        if op == 'test':
+            test = args[0]
+        elif op in ('reborn', 'reposition', 'move'):
+            agent.tell(op, *[tuple(arg) if isinstance(arg, list) else arg for arg in args])
+            summary['calls'] += 1
+        elif op == 'explore':
+            actions = agent.explore()
+            summary['explores'] += 1
+            if actions != args[0]:
+                summary['mismatches'].append({'record': n, 'test': test, 'recorded': args[0], 'replayed': actions})
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a trace of Driver calls against the Agent.')
+    parser.add_argument('path')
+    parser.add_argument('--profile', action='store_true', help='Print a profile of the Agent queries')
+    args = parser.parse_args()
+
+    # Driver starts the Prolog engine, so it is only imported when replaying
+    import Driver
+
+    agent = Driver.default_agent
+    summary = replay(args.path, agent)
+    print(json.dumps(summary, indent=2))
+    if args.profile:
+        sys.stdout.write(agent.profiler.format_report('Replay'))
+    sys.exit(1 if summary['mismatches'] else 0)
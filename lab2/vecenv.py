@@ -0,0 +1,213 @@
+import argparse
+import time
+
+import numpy as np
+
+from layouts import iter_layouts, load_layout
+
+# Vectorized absolute worlds
+# ====================================================================================================
+# Steps N absolute worlds of the same size in lockstep, with the same rules as Simulator.step() in
+# Driver.py (bump, teleport through a Confundus Portal, reset of the game after walking into Wumpus,
+# pickup, shoot), but with every world held in stacked NumPy arrays instead of one Simulator each
+# Actions are integer codes (see ACTIONS), directions are 0-3 for north, east, south, west
+# Percepts are masks in which bit i is L[i] of move(A,L), as in StepResult.percepts
+# Teleports draw from a NumPy generator, so they differ from those of a Simulator with the same seed
+ACTIONS = ['moveforward', 'turnleft', 'turnright', 'pickup', 'shoot']
+MOVEFORWARD, TURNLEFT, TURNRIGHT, PICKUP, SHOOT = range(len(ACTIONS))
+DIRECTIONS = ['north', 'east', 'south', 'west']
+# Absolute row, column offsets of the cell ahead in each direction
+DROW = np.array([-1, 0, 1, 0])
+DCOL = np.array([0, 1, 0, -1])
+# Bits of the sensory indicators, in the same order as L in move(A,L)
+CONFOUNDED, STENCH, TINGLE, GLITTER, BUMP, SCREAM = (1 << i for i in range(6))
+
+
+# Non-wall cells next to any cell of mask, for a stack of worlds
+def adjacent(mask, wall):
+    result = np.zeros_like(mask)
+    result[:, 1:, :] |= mask[:, :-1, :]
+    result[:, :-1, :] |= mask[:, 1:, :]
+    result[:, :, 1:] |= mask[:, :, :-1]
+    result[:, :, :-1] |= mask[:, :, 1:]
+    return result & ~wall
+
+
+class VecWorlds:
+    def __init__(self, layouts, seed=None):
+        layout = np.array(layouts, dtype='<U1')
+        if layout.ndim != 3:
+            raise ValueError('All layouts must have the same size')
+        self.n, self.height, self.width = layout.shape
+        self.rng = np.random.default_rng(seed)
+        self.index = np.arange(self.n)
+
+        # Fixed contents
+        self.wall = layout == '#'
+        self.portal = layout == 'O'
+        self.tingle = adjacent(self.portal, self.wall)
+        # Contents at the start of the game, restored after walking into Wumpus
+        self.start_wumpus = layout == 'W'
+        self.start_stench = adjacent(self.start_wumpus, self.wall)
+        self.start_coin = layout == '*'
+        self.coins_at_start = self.start_coin.sum(axis=(1, 2))
+        # Agent's start pose (if more than one Agent in a layout, the last one counts)
+        self.start_row = np.zeros(self.n, dtype=np.int64)
+        self.start_col = np.zeros(self.n, dtype=np.int64)
+        self.start_direction = np.zeros(self.n, dtype=np.int64)
+        for d, symbol in enumerate('^>v<'):
+            k, i, j = np.nonzero(layout == symbol)
+            self.start_row[k] = i
+            self.start_col[k] = j
+            self.start_direction[k] = d
+
+        # Outcome of the last step, reused by every step (see StepResult in Driver.py)
+        self.percepts = np.zeros(self.n, dtype=np.uint8)
+        self.moved = np.zeros(self.n, dtype=bool)
+        self.bumped = np.zeros(self.n, dtype=bool)
+        self.teleported = np.zeros(self.n, dtype=bool)
+        self.died = np.zeros(self.n, dtype=bool)
+        self.coin = np.zeros(self.n, dtype=bool)
+        self.scream = np.zeros(self.n, dtype=bool)
+        self.reset()
+
+    # Reset every world to the start of the game and return the percepts at the start
+    def reset(self):
+        self.wumpus = self.start_wumpus.copy()
+        self.stench = self.start_stench.copy()
+        self.coins = self.start_coin.copy()
+        self.row = self.start_row.copy()
+        self.col = self.start_col.copy()
+        self.direction = self.start_direction.copy()
+        self.has_arrow = np.ones(self.n, dtype=bool)
+        self.coins_collected = np.zeros(self.n, dtype=np.int64)
+        self.steps = np.zeros(self.n, dtype=np.int64)
+        self.deaths = np.zeros(self.n, dtype=np.int64)
+        self.teleports = np.zeros(self.n, dtype=np.int64)
+        # Confounded is On at the start of the game
+        return self.sense(np.ones(self.n, dtype=bool))
+
+    # Reset the game of the worlds in mask (after walking into Wumpus)
+    def reset_worlds(self, mask):
+        self.wumpus[mask] = self.start_wumpus[mask]
+        self.stench[mask] = self.start_stench[mask]
+        self.coins[mask] = self.start_coin[mask]
+        self.row[mask] = self.start_row[mask]
+        self.col[mask] = self.start_col[mask]
+        self.direction[mask] = self.start_direction[mask]
+        self.has_arrow[mask] = True
+        self.coins_collected[mask] = 0
+
+    # Percepts of the cell each Agent is in, given which Agents are confounded
+    def sense(self, confounded):
+        k, i, j = self.index, self.row, self.col
+        percepts = self.percepts
+        percepts[:] = confounded
+        percepts |= self.stench[k, i, j] * np.uint8(STENCH)
+        percepts |= self.tingle[k, i, j] * np.uint8(TINGLE)
+        percepts |= self.coins[k, i, j] * np.uint8(GLITTER)
+        percepts |= self.bumped * np.uint8(BUMP)
+        percepts |= self.scream * np.uint8(SCREAM)
+        return percepts
+
+    # Apply one action per world (array of action codes) and return the percept masks
+    def step(self, actions):
+        actions = np.asarray(actions)
+        for flags in (self.moved, self.bumped, self.teleported, self.died, self.coin, self.scream):
+            flags[:] = False
+        self.steps += 1
+
+        # Turns
+        self.direction[actions == TURNLEFT] += 3
+        self.direction[actions == TURNRIGHT] += 1
+        self.direction %= 4
+
+        # Pickups
+        k = np.flatnonzero(actions == PICKUP)
+        picked = self.coins[k, self.row[k], self.col[k]]
+        k = k[picked]
+        self.coins[k, self.row[k], self.col[k]] = False
+        self.coins_collected[k] += 1
+        self.coin[k] = True
+
+        # Shots (rare, so one world at a time)
+        for k in np.flatnonzero((actions == SHOOT) & self.has_arrow):
+            self.shoot(k)
+
+        # Moves
+        k = np.flatnonzero(actions == MOVEFORWARD)
+        row_d = self.row[k] + DROW[self.direction[k]]
+        col_d = self.col[k] + DCOL[self.direction[k]]
+        wall = self.wall[k, row_d, col_d]
+        portal = self.portal[k, row_d, col_d] & ~wall
+        wumpus = self.wumpus[k, row_d, col_d] & ~wall & ~portal
+        safe = ~(wall | portal | wumpus)
+        self.bumped[k[wall]] = True
+        self.row[k[safe]] = row_d[safe]
+        self.col[k[safe]] = col_d[safe]
+        self.moved[k[safe]] = True
+        self.teleport(k[portal])
+        died = k[wumpus]
+        self.deaths[died] += 1
+        self.reset_worlds(died)
+        self.died[died] = True
+
+        return self.sense(self.teleported | self.died)
+
+    # Let the arrow of world k fly, killing the last Wumpus in its direction (up to the outer wall)
+    def shoot(self, k):
+        self.has_arrow[k] = False
+        drow, dcol = DROW[self.direction[k]], DCOL[self.direction[k]]
+        row, col = self.row[k] + drow, self.col[k] + dcol
+        hit = None
+        while 0 < row < self.height-1 and 0 < col < self.width-1:
+            if self.wumpus[k, row, col]:
+                hit = row, col
+            row, col = row + drow, col + dcol
+        if hit:
+            row, col = hit
+            self.wumpus[k, row, col] = False
+            for row_n, col_n in ((row-1, col), (row+1, col), (row, col-1), (row, col+1)):
+                if not self.wall[k, row_n, col_n]:
+                    self.stench[k, row_n, col_n] = False
+            self.scream[k] = True
+
+    # Move Agents of worlds k to a random safe cell (any cell without wall, Wumpus or Confundus Portal)
+    # facing a random direction
+    def teleport(self, k):
+        if not len(k):
+            return
+        safe = ~(self.wall[k] | self.wumpus[k] | self.portal[k]).reshape(len(k), -1)
+        # Pick the r-th safe cell of each world, with r uniform over its no. of safe cells
+        r = self.rng.integers(safe.sum(axis=1))
+        cell = np.argmax(np.cumsum(safe, axis=1) > r[:, None], axis=1)
+        self.row[k], self.col[k] = np.divmod(cell, self.width)
+        self.direction[k] = self.rng.integers(4, size=len(k))
+        self.teleports[k] += 1
+        self.teleported[k] = True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the throughput of stepping many worlds at once.')
+    parser.add_argument('layout', nargs='?', help='Layout file to replicate (default: random layouts)')
+    parser.add_argument('-n', type=int, default=1000, help='No. of worlds')
+    parser.add_argument('--size', default='12x8', help='Size WIDTHxHEIGHT of the random layouts')
+    parser.add_argument('--steps', type=int, default=1000, help='No. of steps')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.layout:
+        layouts = [load_layout(args.layout)] * args.n
+    else:
+        width, height = map(int, args.size.split('x'))
+        layouts = [layout for _, layout in iter_layouts(args.n, width, height, args.seed)]
+    worlds = VecWorlds(layouts, args.seed)
+    # Random actions, mostly moves
+    rng = np.random.default_rng(args.seed)
+    actions = rng.choice(len(ACTIONS), size=(args.steps, args.n), p=[0.6, 0.15, 0.15, 0.05, 0.05])
+    start_time = time.perf_counter()
+    for step_actions in actions:
+        worlds.step(step_actions)
+    wall_time = time.perf_counter() - start_time
+    print(f'{args.n} worlds x {args.steps} steps in {wall_time:.2f} s: {args.n*args.steps/wall_time:,.0f} steps/s')
+    print(f'deaths {worlds.deaths.sum()}, teleports {worlds.teleports.sum()}, coins {worlds.coins_collected.sum()}')